@@ -1,8 +1,16 @@
+import time
+
 import streamlit as st
 import pandas as pd
 import numpy as np
+from batch import borehole_profile
 from model import PermafrostModel
-from excel_parser import BoreholeDataParser
+from excel_parser import BoreholeDataParser, FirstBorehole
+from importer import LoggerImporter
+from trainer import JOB_DONE, BackgroundTrainer
+from utils import timing
+
+rerun_start = time.perf_counter()
 
 # Настройка страницы
 st.set_page_config(
@@ -12,10 +20,53 @@ st.set_page_config(
 st.title("🧊 Система термометрии на основе реальных данных")
 st.write("Использует реальные термограммы для точного прогнозирования")
 
+# Сколько рассчитанных профилей держать в кэше
+PROFILE_CACHE_SIZE = 256
+
+
+@st.cache_resource
+def get_model():
+    """Одна модель на процесс, общая для всех сессий"""
+    return PermafrostModel()
+
+
+@st.cache_resource
+def get_trainer():
+    # После обучения прежние профили больше не нужны
+    return BackgroundTrainer(get_model(), on_trained=compute_profile_table.clear)
+
+
+@st.cache_data(max_entries=PROFILE_CACHE_SIZE)
+def compute_profile_table(
+    _model,
+    _borehole_index,
+    file_hash,
+    borehole,
+    surface_temp,
+    season,
+    use_ml,
+    model_version,
+):
+    """
+    Таблица прогнозов для скважины. Ключ кэша - хэш файла, скважина,
+    параметры и версия модели (аргументы с "_" в ключ не входят)
+    """
+    return borehole_profile(
+        _model, _borehole_index, borehole, surface_temp, season, use_ml
+    )
+
+
 # Инициализация
-if "model" not in st.session_state:
-    st.session_state.model = PermafrostModel()
-    st.session_state.parser = BoreholeDataParser()
+model = get_model()
+trainer = get_trainer()
+# Другой процесс мог обучить более новую версию модели
+if model.refresh_ml_model():
+    compute_profile_table.clear()
+
+if "parser" not in st.session_state:
+    # Кэш разобранных журналов общий для процесса, парсер хранит только
+    # хэш последнего файла этой сессии
+    st.session_state.parser = BoreholeDataParser(cache_dir="data/cache")
     st.session_state.borehole_data = None
 
 # Боковая панель
@@ -23,13 +74,48 @@ with st.sidebar:
     st.header("📁 Загрузка данных")
 
     uploaded_file = st.file_uploader(
-        "Загрузите Excel файл бурового журнала", type=["xlsx", "xls"]
+        "Загрузите Excel файл бурового журнала", type=["xlsx", "xls", "csv"]
     )
+    stream_mode = st.checkbox("Потоковое чтение (большие журналы)", value=False)
 
     if uploaded_file is not None:
-        st.session_state.borehole_data = st.session_state.parser.parse_excel_data(
-            uploaded_file
-        )
+        try:
+            if stream_mode or uploaded_file.name.lower().endswith(".csv"):
+                progress = st.empty()
+                preview = st.empty()
+                first_borehole = FirstBorehole()
+
+                def show_progress(chunk, rows_read):
+                    progress.caption(f"Прочитано строк: {rows_read}")
+                    # Первую скважину показываем, не дожидаясь конца файла
+                    if first_borehole.add(chunk):
+                        with preview.container():
+                            st.subheader(
+                                f"Скважина {first_borehole.borehole} "
+                                "(журнал ещё читается)"
+                            )
+                            for i, layer in enumerate(first_borehole.layers, 1):
+                                st.write(
+                                    f"{i}. {layer['lithology']}: "
+                                    f"{layer['depth_from']}-{layer['depth_to']}м"
+                                )
+
+                try:
+                    st.session_state.borehole_data = (
+                        st.session_state.parser.parse_streaming(
+                            uploaded_file, on_chunk=show_progress
+                        )
+                    )
+                finally:
+                    progress.empty()
+                    preview.empty()
+            else:
+                st.session_state.borehole_data = (
+                    st.session_state.parser.parse_excel_data(uploaded_file)
+                )
+        except ValueError as e:
+            st.error(str(e))
+            st.session_state.borehole_data = None
 
         if st.session_state.borehole_data is not None:
             boreholes = st.session_state.parser.get_boreholes_list(
@@ -54,98 +140,85 @@ with st.sidebar:
     season = st.selectbox("Время года", ["зима", "весна", "лето", "осень"])
 
     st.header("🎯 Настройки модели")
-    use_ml = st.checkbox(
-        "Использовать ML модель", value=st.session_state.model.is_ml_trained
-    )
+    use_ml = st.checkbox("Использовать ML модель", value=model.is_ml_trained)
 
     # Информация о модели
     st.subheader("Информация о модели")
-    st.write(f"Эталонная термограмма: K36T")
-    st.write(f"Замеров для обучения: {len(st.session_state.model.training_data)}")
-    st.write(
-        f"ML модель: {'обучена' if st.session_state.model.is_ml_trained else 'не обучена'}"
+    st.write("Встроенная эталонная термограмма: K36T")
+    st.write(f"Замеров для обучения: {model.training_count()}")
+    st.write(f"ML модель: {'обучена' if model.is_ml_trained else 'не обучена'}")
+    if model.model_version:
+        st.write(f"Версия модели: {model.model_version}")
+
+    # Замеры общие для процесса: включение видно во всех сессиях
+    measure_timings = st.checkbox(
+        "Замерять время этапов",
+        value=timing.is_enabled(),
+        help="Время разбора журнала, прогнозов, обучения и отрисовки",
     )
+    if measure_timings != timing.is_enabled():
+        if measure_timings:
+            timing.enable()
+        else:
+            timing.disable()
 
 # Основная область
 if st.session_state.borehole_data is not None and "selected_borehole" in locals():
-    layers = st.session_state.parser.get_layers_for_borehole(
-        st.session_state.borehole_data, selected_borehole
-    )
+    borehole_index = st.session_state.parser.get_index(st.session_state.borehole_data)
 
     st.header(f"Температурный профиль для скважины {selected_borehole}")
+    reference_names = model.reference_names(borehole_index.location(selected_borehole))
+    st.caption(f"Эталонные термограммы: {', '.join(reference_names)}")
 
-    def get_lithology_at_depth(depth, layers):
-        for layer in layers:
-            if depth <= layer["depth_to"]:
-                return layer["lithology"]
-        return layers[-1]["lithology"]
-
-    # Стандартные глубины
-    standard_depths = [
-        0,
-        0.5,
-        1,
-        1.5,
-        2,
-        2.5,
-        3,
-        3.5,
-        4,
-        4.5,
-        5,
-        6,
-        7,
-        8,
-        9,
-        10,
-        12,
-        14,
-        16,
-        18,
-        20,
-        24,
-        26,
-        30,
-    ]
-
-    # Создаём таблицу с прогнозами
-    data = []
-    for depth in standard_depths:
-        if depth <= (layers[-1]["depth_to"] if layers else 30):
-            lith_at_depth = get_lithology_at_depth(depth, layers)
-            predicted_temp = st.session_state.model.predict_temperature(
-                depth, lith_at_depth, surface_temp, season, use_ml
-            )
-
-            ground_state = st.session_state.model.get_ground_state(
-                predicted_temp, lith_at_depth
-            )
-
-            data.append(
-                {
-                    "Глубина (м)": depth,
-                    "Грунт": lith_at_depth,
-                    "Температура (°C)": predicted_temp,
-                    "Состояние": ground_state,
-                }
-            )
-
-    df = pd.DataFrame(data)
+    with timing.timed("app.profile_table"):
+        df = compute_profile_table(
+            model,
+            borehole_index,
+            st.session_state.parser.last_file_hash,
+            selected_borehole,
+            surface_temp,
+            season,
+            use_ml and model.is_ml_trained,
+            model.model_version,
+        )
     st.dataframe(df, use_container_width=True)
 
+    # Точные глубины перехода через пороги состояний (физическая модель)
+    boundary_cols = st.columns(2)
+    for col, (label, state) in zip(
+        boundary_cols,
+        [
+            ("Кровля мёрзлых грунтов (0 °C)", "охлаждённый"),
+            ("Кровля твёрдомёрзлых грунтов", "твёрдомёрзлый"),
+        ],
+    ):
+        with timing.timed("app.state_depths"):
+            boundary = model.borehole_state_depths(
+                borehole_index, [selected_borehole], surface_temp, state
+            )[0, 0]
+        col.metric(
+            label, "не достигнута" if np.isnan(boundary) else f"{boundary:.2f} м"
+        )
+    if use_ml and model.is_ml_trained:
+        st.caption(
+            "Границы рассчитаны по физической модели (эталонный профиль), "
+            "таблица выше - прогноз ML модели, поэтому они могут не совпадать"
+        )
+
     # Визуализация
     st.header("📊 График температурного профиля")
 
-    try:
-        import plotly.express as px
+    with timing.timed("app.plot"):
+        try:
+            import plotly.express as px
 
-        fig = px.line(
-            df, x="Температура (°C)", y="Глубина (м)", title="Температурный профиль"
-        )
-        fig.update_yaxes(autorange="reversed")
-        st.plotly_chart(fig, use_container_width=True)
-    except:
-        st.line_chart(df.set_index("Глубина (м)")["Температура (°C)"])
+            fig = px.line(
+                df, x="Температура (°C)", y="Глубина (м)", title="Температурный профиль"
+            )
+            fig.update_yaxes(autorange="reversed")
+            st.plotly_chart(fig, use_container_width=True)
+        except:
+            st.line_chart(df.set_index("Глубина (м)")["Температура (°C)"])
 
     # Секция для обучения
     st.header("📝 Обучение модели на реальных замерах")
@@ -163,19 +236,57 @@ if st.session_state.borehole_data is not None and "selected_borehole" in locals(
         )
 
     if st.button("Добавить замер для обучения"):
-        st.session_state.model.add_training_data(
-            train_depth, train_lithology, surface_temp, season, actual_temp
+        model.add_training_data(
+            train_depth,
+            train_lithology,
+            surface_temp,
+            season,
+            actual_temp,
+            borehole=selected_borehole,
         )
         st.success(
-            f"Замер на глубине {train_depth}м добавлен. Всего замеров: {len(st.session_state.model.training_data)}"
+            f"Замер на глубине {train_depth}м добавлен. Всего замеров: {model.training_count()}"
+        )
+
+    incremental = st.checkbox(
+        "Дообучать только на новых замерах",
+        value=True,
+        help="Небольшой прирост замеров не вызывает полного переобучения",
+    )
+    if st.button("Обучить ML модель") and model.training_count() > 0:
+        trainer.submit(incremental=incremental)
+
+    with st.expander("📥 Импорт данных термокос (CSV логгеров)"):
+        st.caption(
+            "Колонки: borehole, depth, timestamp, temperature и, если есть, "
+            "surface_temp. Грунт берётся из загруженного журнала"
         )
+        logger_file = st.file_uploader("CSV логгера", type=["csv"], key="logger")
+        if logger_file is not None and st.button("Импортировать замеры"):
+            importer = LoggerImporter(model, borehole_index)
+            try:
+                stats = importer.import_file(logger_file)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if stats["skipped"]:
+                    st.info("Этот файл уже загружен")
+                else:
+                    st.success(
+                        f"Строк: {stats['rows']}, добавлено замеров: "
+                        f"{stats['samples']}. Всего замеров: {model.training_count()}"
+                    )
 
-    if st.button("Обучить ML модель") and len(st.session_state.model.training_data) > 0:
-        success, message = st.session_state.model.train_ml_model()
-        if success:
-            st.success(message)
+    # Обучение идёт в фоне, здесь только показываем статус последней задачи
+    job = trainer.status()
+    if job is not None:
+        if job.is_active:
+            st.info(f"Обучение модели: {job.state} ({job.duration:.1f} с)")
+            st.button("Обновить статус")
+        elif job.state == JOB_DONE:
+            st.success(job.message)
         else:
-            st.error(message)
+            st.error(job.message)
 
 else:
     st.info("👆 Загрузите файл бурового журнала чтобы начать работу")
@@ -195,3 +306,25 @@ with st.expander("📋 Информация об эталонной термог
     Модель корректирует этот профиль под вашу температуру поверхности.
     """
     )
+
+# Панель производительности (в конце, чтобы учесть замеры этого прогона)
+if timing.is_enabled():
+    with st.sidebar:
+        st.subheader("⏱️ Производительность")
+        if st.button("Сбросить замеры"):
+            timing.reset()
+        timing.record("app.rerun", time.perf_counter() - rerun_start)
+
+        stats = timing.snapshot()
+        st.dataframe(
+            pd.DataFrame(stats["stages"]).set_index("stage"),
+            use_container_width=True,
+        )
+        for name, value in stats["counters"].items():
+            st.caption(f"{name}: {value}")
+        st.download_button(
+            "Скачать замеры (JSON)",
+            timing.export_json(),
+            file_name="timings.json",
+            mime="application/json",
+        )
@@ -0,0 +1,255 @@
+"""
+Пакетный расчёт температурных профилей для всех скважин журнала.
+
+Запуск из корня проекта:
+    python -m batch journal.xlsx -o profiles.parquet --surface-temp -1 --season лето
+
+Формат результата определяется расширением: .parquet, .csv или .xlsx.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from excel_parser import BoreholeDataParser, BoreholeIndex
+from model import GROUND_STATES, STANDARD_DEPTHS, PermafrostModel
+from utils.lithology import LITHOLOGY_TYPES
+
+# Сколько скважин обрабатывает один процесс за одну задачу
+BOREHOLES_PER_TASK = 20
+
+PROFILE_COLUMNS = [
+    "Скважина",
+    "Глубина (м)",
+    "Грунт",
+    "Температура (°C)",
+    "Состояние",
+]
+
+# Модель и индекс журнала в процессе-обработчике (создаются один раз)
+_worker_state = {}
+
+
+def borehole_profile(
+    model, index, borehole, surface_temp, season="лето", use_ml=False, depths=None
+):
+    """
+    Таблица прогнозов для одной скважины: глубины не глубже подошвы
+    последнего слоя, грунт, температура и состояние грунта. Если в журнале
+    есть координаты скважины, эталон - ближайшие термограммы библиотеки
+    """
+    depths = np.asarray(STANDARD_DEPTHS if depths is None else depths, dtype=float)
+    depths = depths[depths <= index.max_depth(borehole)]
+    lithology_codes = index.lithology_codes_at(borehole, depths)
+    predicted_temps = model.predict_profile(
+        depths,
+        lithology_codes,
+        surface_temp,
+        season,
+        use_ml,
+        location=index.location(borehole),
+    )
+    state_codes = model.classify_ground_states(predicted_temps, lithology_codes)
+
+    return pd.DataFrame(
+        {
+            "Глубина (м)": depths,
+            "Грунт": np.array(LITHOLOGY_TYPES)[lithology_codes],
+            "Температура (°C)": predicted_temps,
+            "Состояние": np.array(GROUND_STATES)[state_codes],
+        }
+    )
+
+
+def profiles_for_boreholes(
+    model, index, boreholes, surface_temp, season, use_ml, depths
+):
+    """Профили нескольких скважин одной таблицей"""
+    tables = []
+    for borehole in boreholes:
+        table = borehole_profile(
+            model, index, borehole, surface_temp, season, use_ml, depths
+        )
+        table.insert(0, "Скважина", str(borehole))
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
+
+
+def _init_worker(df):
+    _worker_state["model"] = PermafrostModel()
+    _worker_state["index"] = BoreholeIndex(df)
+
+
+def _worker_task(boreholes, surface_temp, season, use_ml, depths):
+    return profiles_for_boreholes(
+        _worker_state["model"],
+        _worker_state["index"],
+        boreholes,
+        surface_temp,
+        season,
+        use_ml,
+        depths,
+    )
+
+
+def compute_site_profiles(
+    df, surface_temp, season="лето", use_ml=False, depths=None, workers=None
+):
+    """
+    Профили всех скважин журнала (DataFrame из BoreholeDataParser).
+    Генератор таблиц по BOREHOLES_PER_TASK скважин в порядке журнала,
+    расчёт распределяется по workers процессам (None - по числу ядер)
+    """
+    index = BoreholeIndex(df)
+    tasks = [
+        index.boreholes[i : i + BOREHOLES_PER_TASK]
+        for i in range(0, len(index.boreholes), BOREHOLES_PER_TASK)
+    ]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(tasks) <= 1:
+        model = PermafrostModel()
+        for boreholes in tasks:
+            yield profiles_for_boreholes(
+                model, index, boreholes, surface_temp, season, use_ml, depths
+            )
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        initializer=_init_worker,
+        initargs=(df,),
+    ) as executor:
+        yield from executor.map(
+            _worker_task,
+            tasks,
+            [surface_temp] * len(tasks),
+            [season] * len(tasks),
+            [use_ml] * len(tasks),
+            [depths] * len(tasks),
+        )
+
+
+def write_site_profiles(tables, output_path):
+    """
+    Записываем таблицы профилей по мере расчёта, не собирая их в памяти.
+    Возвращает число записанных строк
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".parquet":
+        return _write_parquet(tables, output_path)
+    if extension == ".csv":
+        return _write_csv(tables, output_path)
+    if extension in (".xlsx", ".xls"):
+        return _write_excel(tables, output_path)
+    raise ValueError(f"Неподдерживаемый формат результата: {extension}")
+
+
+def _write_csv(tables, output_path):
+    rows = 0
+    for table in tables:
+        table.to_csv(
+            output_path,
+            mode="w" if rows == 0 else "a",
+            header=rows == 0,
+            index=False,
+        )
+        rows += len(table)
+    return rows
+
+
+def _write_parquet(tables, output_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for table in tables:
+            arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, arrow_table.schema)
+            writer.write_table(arrow_table.cast(writer.schema))
+            rows += len(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _write_excel(tables, output_path):
+    rows = 0
+    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+        for table in tables:
+            table.to_excel(
+                writer,
+                sheet_name="Профили",
+                startrow=0 if rows == 0 else rows + 1,
+                header=rows == 0,
+                index=False,
+            )
+            rows += len(table)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Температурные профили для всех скважин бурового журнала"
+    )
+    parser.add_argument("journal", help="Буровой журнал (.xlsx или .csv)")
+    parser.add_argument(
+        "-o", "--output", required=True, help="Результат (.parquet, .csv, .xlsx)"
+    )
+    parser.add_argument("--surface-temp", type=float, default=-1.0)
+    parser.add_argument(
+        "--season", default="лето", choices=["зима", "весна", "лето", "осень"]
+    )
+    parser.add_argument("--ml", action="store_true", help="Использовать ML модель")
+    parser.add_argument(
+        "--depth-step",
+        type=float,
+        help="Шаг по глубине, м (по умолчанию стандартные глубины)",
+    )
+    parser.add_argument("--max-depth", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, help="Число процессов")
+    parser.add_argument(
+        "--streaming", action="store_true", help="Потоковое чтение журнала"
+    )
+    args = parser.parse_args(argv)
+
+    journal_parser = BoreholeDataParser()
+    try:
+        if args.streaming or args.journal.lower().endswith(".csv"):
+            df = journal_parser.parse_streaming(args.journal)
+        else:
+            df = journal_parser.parse_excel_data(args.journal)
+    except ValueError as e:
+        print(f"Не удалось прочитать журнал {args.journal}: {e}", file=sys.stderr)
+        return 1
+
+    depths = None
+    if args.depth_step:
+        depths = np.arange(0.0, args.max_depth + args.depth_step / 2, args.depth_step)
+
+    tables = compute_site_profiles(
+        df,
+        args.surface_temp,
+        args.season,
+        use_ml=args.ml,
+        depths=depths,
+        workers=args.workers,
+    )
+    rows = write_site_profiles(tables, args.output)
+    print(f"Записано строк: {rows} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Время импорта модулей приложения в чистом процессе Python.
+
+Запуск из корня проекта:
+    python -m benchmarks.startup [--repeat 5] [--output startup.json]
+
+Код выхода 1, если модуль превысил бюджет времени импорта или при импорте
+подтянул тяжёлые библиотеки, которые должны загружаться только по требованию.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджет времени импорта, мс (с запасом для медленных машин)
+STARTUP_BUDGET_MS = {
+    "utils.lithology": 300,
+    "database": 300,
+    "models.registry": 100,
+    "model": 400,
+    "trainer": 100,
+    "excel_parser": 3000,
+}
+
+# Библиотеки, которые не должны загружаться при импорте модуля
+LAZY_IMPORTS = ["sklearn", "scipy", "joblib"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed * 1000, ",".join(loaded))
+"""
+
+
+def measure_import(module, repeat=5):
+    """
+    Время импорта модуля (минимум по repeat запускам, мс) и список
+    тяжёлых библиотек, загруженных вместе с ним
+    """
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_IMPORTS)],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, _, names = result.stdout.strip().partition(" ")
+        timings.append(float(elapsed))
+        loaded = [name for name in names.split(",") if name]
+    return min(timings), loaded
+
+
+def run(repeat=5):
+    results = []
+    for module, budget in STARTUP_BUDGET_MS.items():
+        elapsed, loaded = measure_import(module, repeat)
+        results.append(
+            {
+                "module": module,
+                "import_ms": round(elapsed, 1),
+                "budget_ms": budget,
+                "eager_heavy_imports": loaded,
+                "ok": elapsed <= budget and not loaded,
+            }
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время импорта модулей")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON файл для результатов")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    for row in results:
+        status = "OK" if row["ok"] else "ПРЕВЫШЕН"
+        heavy = ", ".join(row["eager_heavy_imports"]) or "-"
+        print(
+            f"{row['module']:<18} {row['import_ms']:>8.1f} мс "
+            f"(бюджет {row['budget_ms']} мс, тяжёлые импорты: {heavy}) {status}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return 0 if all(row["ok"] for row in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
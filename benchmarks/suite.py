@@ -0,0 +1,278 @@
+"""
+Бенчмарк основных операций на синтетических журналах разного размера.
+
+Запуск из корня проекта:
+    python -m benchmarks.suite --sizes 10 1000 100000 [--repeat 3]
+        [--format xlsx] [--output results.json] [--baseline old.json]
+
+Для каждого размера журнала (число скважин) замеряются разбор журнала,
+поиск слоёв скважины, прогнозы по эталону и ML модели, состояние грунта и
+обучение. Результаты пишутся в JSON; с --baseline код выхода 1, если
+операция стала медленнее прошлого прогона больше чем на --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import (
+    LITHOLOGY_NAMES,
+    SEASONS,
+    generate_journal,
+    generate_measurements,
+    write_journal,
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [10, 1000, 10000]
+
+# Число вызовов на замер для поштучных операций
+LOOKUP_CALLS = 1000
+PREDICT_CALLS = 2000
+ML_PREDICT_CALLS = 200
+
+# Замеры для обучения: на скважину и не больше всего
+MEASUREMENTS_PER_BOREHOLE = 5
+MAX_TRAINING_SAMPLES = 200000
+
+# Допустимое замедление относительно --baseline (доля)
+REGRESSION_TOLERANCE = 0.2
+
+
+def measure(func, calls=1, repeat=3):
+    """
+    Время repeat прогонов func (func сам делает calls вызовов операции):
+    лучшее и медианное время прогона, время одного вызова по лучшему
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        "calls": calls,
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(timings), 6),
+        "per_call_ms": round(best / calls * 1000, 4),
+    }
+
+
+def bench_size(boreholes, repeat=3, file_format="xlsx", workdir=None, seed=0):
+    """Замеры для журнала из boreholes скважин: список словарей"""
+    import excel_parser
+    from database import MeasurementStore
+    from excel_parser import BoreholeDataParser
+    from model import PermafrostModel
+    from models.registry import ModelRegistry
+
+    results = []
+
+    def record(stage, timing):
+        results.append({"boreholes": boreholes, "stage": stage, **timing})
+
+    rng = np.random.default_rng(seed)
+
+    # Разбор журнала: кэш разобранных файлов сбрасываем перед каждым прогоном
+    journal = generate_journal(boreholes, seed)
+    path = os.path.join(workdir, f"journal_{boreholes}.{file_format}")
+    write_journal(journal, path)
+    parser = BoreholeDataParser()
+
+    def parse():
+        excel_parser._parse_cache.clear()
+        excel_parser._index_cache.clear()
+        if file_format == "csv":
+            return parser.parse_streaming(path)
+        return parser.parse_excel_data(path)
+
+    stage = "parse_streaming" if file_format == "csv" else "parse_excel_data"
+    record(stage, measure(parse, 1, repeat))
+    df = parse()
+
+    # Первый запрос слоёв строит индекс скважин, дальше - поиск по индексу
+    record("get_index", measure(lambda: excel_parser.BoreholeIndex(df), 1, repeat))
+    boreholes_list = parser.get_boreholes_list(df)
+    sample = [
+        boreholes_list[i] for i in rng.integers(0, len(boreholes_list), LOOKUP_CALLS)
+    ]
+    parser.get_layers_for_borehole(df, sample[0])
+
+    def lookup():
+        for borehole in sample:
+            parser.get_layers_for_borehole(df, borehole)
+
+    record("get_layers_for_borehole", measure(lookup, LOOKUP_CALLS, repeat))
+
+    # Прогнозы по эталону и состояние грунта
+    model = PermafrostModel(
+        store=MeasurementStore(os.path.join(workdir, f"bench_{boreholes}.db")),
+        registry=ModelRegistry(os.path.join(workdir, f"models_{boreholes}")),
+    )
+    depths = np.round(rng.uniform(0.0, 30.0, PREDICT_CALLS), 1).tolist()
+    lithologies = [
+        LITHOLOGY_NAMES[i] for i in rng.integers(0, len(LITHOLOGY_NAMES), PREDICT_CALLS)
+    ]
+    surface_temps = np.round(rng.uniform(-10.0, 5.0, PREDICT_CALLS), 1).tolist()
+    seasons = [SEASONS[i] for i in rng.integers(0, len(SEASONS), PREDICT_CALLS)]
+    temps = np.round(rng.uniform(-3.0, 1.0, PREDICT_CALLS), 2).tolist()
+
+    def predict():
+        for args in zip(depths, lithologies, surface_temps, seasons):
+            model.predict_temperature(*args, use_ml=False)
+
+    record("predict_temperature", measure(predict, PREDICT_CALLS, repeat))
+
+    def ground_state():
+        for temp, lithology in zip(temps, lithologies):
+            model.get_ground_state(temp, lithology)
+
+    record("get_ground_state", measure(ground_state, PREDICT_CALLS, repeat))
+
+    # Обучение на синтетических замерах (полное переобучение в каждом прогоне)
+    per_borehole = max(
+        1, min(MEASUREMENTS_PER_BOREHOLE, MAX_TRAINING_SAMPLES // boreholes)
+    )
+    measured_boreholes = min(boreholes, MAX_TRAINING_SAMPLES // per_borehole)
+    (
+        measurement_boreholes,
+        measurement_depths,
+        measurement_lithologies,
+        measurement_surface_temps,
+        measurement_seasons,
+        actual_temps,
+    ) = generate_measurements(model, measured_boreholes, per_borehole, seed)
+    model.add_training_batch(
+        measurement_depths,
+        measurement_lithologies,
+        measurement_surface_temps,
+        measurement_seasons,
+        actual_temps,
+        boreholes=measurement_boreholes,
+    )
+
+    def train():
+        success, message = model.train_ml_model()
+        if not success:
+            raise RuntimeError(message)
+
+    timing = measure(train, 1, repeat)
+    timing["samples"] = len(actual_temps)
+    record("train_ml_model", timing)
+
+    def ml_predict():
+        for args in list(zip(depths, lithologies, surface_temps, seasons))[
+            :ML_PREDICT_CALLS
+        ]:
+            model.ml_prediction(*args)
+
+    record("ml_prediction", measure(ml_predict, ML_PREDICT_CALLS, repeat))
+
+    return results
+
+
+def environment():
+    """Версии и машина, на которой сняты замеры"""
+    import pandas as pd
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Операции, ставшие медленнее baseline больше чем на tolerance"""
+    previous = {(row["boreholes"], row["stage"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = previous.get((row["boreholes"], row["stage"]))
+        if old is None or old["best_s"] <= 0:
+            continue
+        ratio = row["best_s"] / old["best_s"]
+        if ratio > 1 + tolerance:
+            regressions.append({**row, "baseline_s": old["best_s"], "ratio": ratio})
+    return regressions
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3, file_format="xlsx", seed=0):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="permafrost-bench-") as workdir:
+        for boreholes in sizes:
+            results.extend(bench_size(boreholes, repeat, file_format, workdir, seed))
+    return {"environment": environment(), "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк на синтетических журналах")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Размеры журналов, число скважин",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON файл для результатов")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, args.format, args.seed)
+    for row in report["results"]:
+        print(
+            f"{row['boreholes']:>7} {row['stage']:<24} {row['best_s']:>10.4f} с "
+            f"({row['calls']} выз., {row['per_call_ms']:.4f} мс/выз.)"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        for row in regressions:
+            print(
+                f"ЗАМЕДЛЕНИЕ: {row['boreholes']} {row['stage']} "
+                f"{row['baseline_s']:.4f} -> {row['best_s']:.4f} с "
+                f"(x{row['ratio']:.2f})"
+            )
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
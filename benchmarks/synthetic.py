@@ -0,0 +1,137 @@
+"""
+Синтетические буровые журналы и замеры температуры для бенчмарков.
+
+Запуск из корня проекта (записать журнал в файл):
+    python -m benchmarks.synthetic 1000 -o journal.xlsx [--seed 0]
+
+Колонки журнала совпадают с BoreholeDataParser.expected_columns.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from excel_parser import BoreholeDataParser
+
+# Описания грунтов в журнале (как в реальных журналах, со свойствами)
+LITHOLOGY_NAMES = [
+    "ПРС",
+    "Почвенно-растительный слой",
+    "Торф слаборазложившийся",
+    "Торф среднеразложившийся",
+    "Суглинок тугопластичный",
+    "Суглинок мягкопластичный",
+    "Супесь пластичная",
+    "Супесь твёрдая",
+    "Песок мелкий",
+    "Песок пылеватый",
+]
+
+# Число слоёв в скважине и мощность слоя, м
+LAYERS_MIN = 3
+LAYERS_MAX = 8
+THICKNESS_MIN = 0.3
+THICKNESS_MAX = 6.0
+
+# Сезоны замеров (как в приложении)
+SEASONS = ["зима", "весна", "лето", "осень"]
+
+
+def generate_journal(boreholes, seed=0):
+    """Журнал на boreholes скважин, по LAYERS_MIN-LAYERS_MAX слоёв в каждой"""
+    rng = np.random.default_rng(seed)
+    layer_counts = rng.integers(LAYERS_MIN, LAYERS_MAX + 1, boreholes)
+    rows = int(layer_counts.sum())
+
+    borehole_ids = np.repeat(np.arange(1, boreholes + 1), layer_counts)
+    thickness = np.round(rng.uniform(THICKNESS_MIN, THICKNESS_MAX, rows), 1)
+
+    # Подошва слоя - накопленная мощность слоёв своей скважины
+    depth_to = np.cumsum(thickness)
+    first_rows = np.repeat(np.cumsum(layer_counts) - layer_counts, layer_counts)
+    depth_to = np.round(depth_to - depth_to[first_rows] + thickness[first_rows], 1)
+    depth_from = np.round(depth_to - thickness, 1)
+
+    names = np.array(LITHOLOGY_NAMES, dtype=object)[
+        rng.integers(0, len(LITHOLOGY_NAMES), rows)
+    ]
+    dates = pd.Timestamp("2023-06-01") + pd.to_timedelta(
+        np.repeat(rng.integers(0, 120, boreholes), layer_counts), unit="D"
+    )
+
+    columns = {
+        "Скважина": [f"СКВ-{i:06d}" for i in borehole_ids],
+        "Глубина от, м": depth_from,
+        "Глубина до, м": depth_to,
+        "Мощность, м": thickness,
+        "Интервалы керна": [f"{a:.1f}-{b:.1f}" for a, b in zip(depth_from, depth_to)],
+        "Литология": names,
+        "Описание": [f"{name}, мёрзлый" for name in names],
+        "Дата создания": dates,
+    }
+    return pd.DataFrame(columns)[BoreholeDataParser().expected_columns]
+
+
+def generate_measurements(model, boreholes, per_borehole=5, seed=0):
+    """
+    Замеры для обучения: прогноз по эталону плюс шум на случайных
+    глубинах. Возвращает массивы (скважины, глубины, грунты, температуры
+    поверхности, сезоны, температуры)
+    """
+    rng = np.random.default_rng(seed)
+    count = boreholes * per_borehole
+
+    borehole_ids = np.repeat(
+        [f"СКВ-{i:06d}" for i in range(1, boreholes + 1)], per_borehole
+    )
+    depths = np.round(rng.uniform(0.0, 30.0, count), 1)
+    lithologies = np.array(LITHOLOGY_NAMES, dtype=object)[
+        rng.integers(0, len(LITHOLOGY_NAMES), count)
+    ]
+    surface_temps = np.round(rng.uniform(-10.0, 5.0, count), 1)
+    seasons = np.array(SEASONS, dtype=object)[rng.integers(0, len(SEASONS), count)]
+
+    lithology_codes = model.encode_lithologies(lithologies)
+    influence = model.get_surface_influence_profile(depths)
+    actual_temps = (
+        model.interpolate_reference(depths)
+        + (surface_temps - model.reference_surface_temp) * influence
+        + 0.1 * lithology_codes
+        + rng.normal(0.0, 0.2, count)
+    )
+
+    return (
+        borehole_ids,
+        depths,
+        lithologies,
+        surface_temps,
+        seasons,
+        np.round(actual_temps, 2),
+    )
+
+
+def write_journal(df, path):
+    """Журнал в .xlsx или .csv"""
+    if str(path).lower().endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синтетический буровой журнал")
+    parser.add_argument("boreholes", type=int, help="Число скважин")
+    parser.add_argument("-o", "--output", required=True, help="Файл (.xlsx, .csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    df = generate_journal(args.boreholes, args.seed)
+    write_journal(df, args.output)
+    print(f"Скважин: {args.boreholes}, слоёв: {len(df)} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
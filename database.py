@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from utils.timing import timed
+
+DEFAULT_DB_PATH = os.path.join("data", "measurements.db")
+
+# Порядок признаков совпадает с входом ML модели
+FEATURE_COLUMNS = ["depth", "lithology", "surface_temp", "season"]
+TARGET_COLUMN = "actual_temp"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    borehole TEXT,
+    depth REAL NOT NULL,
+    lithology INTEGER NOT NULL,
+    surface_temp REAL NOT NULL,
+    season INTEGER NOT NULL,
+    actual_temp REAL NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_borehole_depth_season
+    ON measurements (borehole, depth, season);
+CREATE TABLE IF NOT EXISTS imports (
+    file_hash TEXT PRIMARY KEY,
+    source TEXT,
+    samples INTEGER NOT NULL,
+    imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class MeasurementStore:
+    """
+    Хранилище замеров температуры в SQLite (режим WAL, чтобы несколько
+    сессий приложения могли читать и писать одновременно)
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        # sqlite3 не разрешает использовать соединение из чужого потока,
+        # поэтому у каждого потока своё соединение
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, depth, lithology, surface_temp, season, actual_temp, borehole=None):
+        """Добавляем один замер (коды грунта и сезона уже закодированы)"""
+        self.add_many([(borehole, depth, lithology, surface_temp, season, actual_temp)])
+
+    def add_many(self, rows):
+        """
+        Пакетная вставка замеров одной транзакцией.
+        rows - итерируемое кортежей
+        (borehole, depth, lithology, surface_temp, season, actual_temp)
+        """
+        with self.connect() as conn:
+            cursor = conn.executemany(
+                "INSERT INTO measurements "
+                "(borehole, depth, lithology, surface_temp, season, actual_temp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return cursor.rowcount
+
+    def count(self):
+        return self.connect().execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    @timed("database.load_training_arrays")
+    def load_training_arrays(self, with_boreholes=False):
+        """
+        Признаки X (n x 4, порядок FEATURE_COLUMNS) и целевые температуры y
+        сразу в массивах NumPy. with_boreholes=True - третьим массивом ещё
+        номера скважин замеров (None, если скважина не указана)
+        """
+        conn = self.connect()
+        columns = FEATURE_COLUMNS + [TARGET_COLUMN]
+
+        # Счётчик и выборка в одной транзакции чтения видят один снимок базы
+        conn.execute("BEGIN")
+        try:
+            n = self.count()
+            cursor = conn.execute(
+                f"SELECT {', '.join(columns)} FROM measurements ORDER BY id"
+            )
+            records = np.fromiter(
+                cursor, dtype=[(col, np.float64) for col in columns], count=n
+            )
+            if with_boreholes:
+                cursor = conn.execute("SELECT borehole FROM measurements ORDER BY id")
+                boreholes = np.array([row[0] for row in cursor], dtype=object)
+        finally:
+            conn.commit()
+
+        X = np.column_stack([records[col] for col in FEATURE_COLUMNS])
+        y = records[TARGET_COLUMN]
+        if with_boreholes:
+            return X, y, boreholes
+        return X, y
+
+    def is_imported(self, file_hash):
+        """Загружался ли уже файл логгера с таким хэшем содержимого"""
+        row = (
+            self.connect()
+            .execute("SELECT 1 FROM imports WHERE file_hash = ?", (file_hash,))
+            .fetchone()
+        )
+        return row is not None
+
+    def record_import(self, file_hash, source, samples):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO imports (file_hash, source, samples) "
+                "VALUES (?, ?, ?)",
+                (file_hash, source, samples),
+            )
+
+    def clear(self):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM measurements")
+            conn.execute("DELETE FROM imports")
@@ -0,0 +1,309 @@
+"""
+Оценка ML модели кросс-валидацией по скважинам и подбор параметров леса.
+
+Запуск из корня проекта:
+    python -m evaluation [--folds 5] [--jobs -1] [--output report.json]
+
+Замеры одной скважины целиком попадают либо в обучение, либо в проверку
+(GroupKFold), поэтому ошибка показывает качество прогноза для новой
+скважины. Для каждого набора параметров считаются MAE/RMSE, время
+обучения и прогноза; для сравнения - ошибка эталонного профиля
+(predict_profile без ML) на тех же проверочных замерах. Результаты фолдов
+кэшируются на диске по содержимому фолда и параметрам: повторный запуск
+переобучает только новые наборы параметров или изменившиеся данные.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from database import MeasurementStore
+from model import ML_BASE_TREES, PermafrostModel
+
+EVALUATION_CACHE_DIR = os.path.join("data", "evaluation")
+
+N_FOLDS = 5
+# Меньше скважин - оценка по скважинам не имеет смысла
+MIN_GROUPS = 2
+
+# Сетка параметров RandomForestRegressor
+PARAM_GRID = {
+    "n_estimators": [25, ML_BASE_TREES, 100, 200],
+    "max_depth": [None, 12, 20],
+    "min_samples_leaf": [1, 5],
+}
+
+RANDOM_STATE = 42
+
+
+def load_evaluation_data(store):
+    """
+    Замеры из базы: X, y и группа каждого замера (скважина; замер без
+    скважины - отдельная группа)
+    """
+    X, y, boreholes = store.load_training_arrays(with_boreholes=True)
+    groups = np.array(
+        [
+            f"#{i}" if borehole is None else str(borehole)
+            for i, borehole in enumerate(boreholes)
+        ],
+        dtype=object,
+    )
+    return X, y, groups
+
+
+def make_folds(X, y, groups, n_folds=N_FOLDS):
+    """Разбиение GroupKFold: список пар (индексы обучения, индексы проверки)"""
+    from sklearn.model_selection import GroupKFold
+
+    n_groups = len(set(groups))
+    if n_groups < MIN_GROUPS:
+        raise ValueError(
+            f"Для оценки по скважинам нужно минимум {MIN_GROUPS} скважины, "
+            f"в базе {n_groups}"
+        )
+    splitter = GroupKFold(n_splits=min(n_folds, n_groups))
+    return list(splitter.split(X, y, groups))
+
+
+def param_combinations(param_grid=PARAM_GRID):
+    names = sorted(param_grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(param_grid[name] for name in names))
+    ]
+
+
+def fold_digest(X, y, train, test):
+    """Отпечаток содержимого фолда: меняется вместе с данными"""
+    digest = hashlib.sha256()
+    for array in (X[train], y[train], X[test], y[test]):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(digest, params):
+    import sklearn
+
+    payload = json.dumps(
+        {"fold": digest, "params": params, "sklearn": sklearn.__version__},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def scores(y_true, y_pred):
+    errors = y_pred - y_true
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "rmse": float(np.sqrt(np.mean(errors**2))),
+    }
+
+
+def evaluate_fold(X_train, y_train, X_test, y_test, params):
+    """Обучение леса с params на фолде: ошибки и время обучения/прогноза"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    forest = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1, **params)
+    start = time.perf_counter()
+    forest.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = forest.predict(X_test)
+    predict_s = time.perf_counter() - start
+
+    return {
+        **scores(y_test, predictions),
+        "fit_s": fit_s,
+        "predict_us_per_row": predict_s / len(y_test) * 1e6,
+    }
+
+
+def baseline_predictions(model, X):
+    """
+    Прогноз эталонного профиля (без ML) для замеров: по одному вызову
+    predict_profile на каждую встречающуюся температуру поверхности
+    (эталонный профиль от сезона не зависит)
+    """
+    predictions = np.empty(len(X))
+    surface_temps, inverse = np.unique(X[:, 2], return_inverse=True)
+    for i, surface_temp in enumerate(surface_temps):
+        rows = np.flatnonzero(inverse == i)
+        predictions[rows] = model.predict_profile(
+            X[rows, 0], X[rows, 1].astype(np.intp), float(surface_temp), use_ml=False
+        )
+    return predictions
+
+
+class FoldCache:
+    """Результаты фолдов в JSON файлах папки cache_dir (None - без кэша)"""
+
+    def __init__(self, cache_dir=EVALUATION_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self.path(key))
+
+
+def evaluate(
+    store=None,
+    param_grid=PARAM_GRID,
+    n_folds=N_FOLDS,
+    n_jobs=-1,
+    cache_dir=EVALUATION_CACHE_DIR,
+    model=None,
+):
+    """
+    Кросс-валидация всех наборов параметров. Возвращает отчёт: ошибка
+    эталонного профиля и строки по наборам параметров (по возрастанию RMSE)
+    """
+    from joblib import Parallel, delayed
+
+    store = store if store is not None else MeasurementStore()
+    X, y, groups = load_evaluation_data(store)
+    folds = make_folds(X, y, groups, n_folds)
+    candidates = param_combinations(param_grid)
+    cache = FoldCache(cache_dir)
+
+    # Ошибка эталонного профиля на тех же проверочных замерах
+    model = model if model is not None else PermafrostModel(store=store)
+    baseline = baseline_predictions(model, X)
+    baseline_folds = [scores(y[test], baseline[test]) for _, test in folds]
+
+    # Из кэша берём готовые фолды, параллельно считаем только недостающие
+    digests = [fold_digest(X, y, train, test) for train, test in folds]
+    results = {}
+    tasks = []
+    for c, params in enumerate(candidates):
+        for f, digest in enumerate(digests):
+            key = cache_key(digest, params)
+            cached = cache.get(key)
+            if cached is not None:
+                results[c, f] = cached
+            else:
+                tasks.append((c, f, key))
+
+    computed = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_fold)(
+            X[folds[f][0]],
+            y[folds[f][0]],
+            X[folds[f][1]],
+            y[folds[f][1]],
+            candidates[c],
+        )
+        for c, f, _ in tasks
+    )
+    for (c, f, key), result in zip(tasks, computed):
+        cache.put(key, result)
+        results[c, f] = result
+
+    baseline_mae = float(np.mean([row["mae"] for row in baseline_folds]))
+    baseline_rmse = float(np.mean([row["rmse"] for row in baseline_folds]))
+
+    rows = []
+    for c, params in enumerate(candidates):
+        fold_results = [results[c, f] for f in range(len(folds))]
+        rmse = [row["rmse"] for row in fold_results]
+        rows.append(
+            {
+                "params": params,
+                "mae": float(np.mean([row["mae"] for row in fold_results])),
+                "rmse": float(np.mean(rmse)),
+                "rmse_std": float(np.std(rmse)),
+                "fit_s": float(np.mean([row["fit_s"] for row in fold_results])),
+                "predict_us_per_row": float(
+                    np.mean([row["predict_us_per_row"] for row in fold_results])
+                ),
+            }
+        )
+    for row in rows:
+        row["rmse_vs_baseline"] = row["rmse"] / baseline_rmse if baseline_rmse else None
+        # Оптимум по Парето: нет набора точнее и одновременно быстрее
+        row["pareto"] = not any(
+            other["rmse"] < row["rmse"]
+            and other["predict_us_per_row"] < row["predict_us_per_row"]
+            for other in rows
+        )
+    rows.sort(key=lambda row: row["rmse"])
+
+    return {
+        "samples": int(len(y)),
+        "boreholes": int(len(set(groups))),
+        "folds": len(folds),
+        "refitted": len(tasks),
+        "baseline": {"mae": baseline_mae, "rmse": baseline_rmse},
+        "candidates": rows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Кросс-валидация ML модели по скважинам и подбор параметров"
+    )
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--jobs", type=int, default=-1, help="Число процессов")
+    parser.add_argument("--db", help="База замеров (по умолчанию data/measurements.db)")
+    parser.add_argument("--no-cache", action="store_true", help="Без кэша фолдов")
+    parser.add_argument("--output", help="JSON файл для отчёта")
+    args = parser.parse_args(argv)
+
+    store = MeasurementStore(args.db) if args.db else MeasurementStore()
+    try:
+        report = evaluate(
+            store,
+            n_folds=args.folds,
+            n_jobs=args.jobs,
+            cache_dir=None if args.no_cache else EVALUATION_CACHE_DIR,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    baseline = report["baseline"]
+    print(
+        f"Замеров: {report['samples']}, скважин: {report['boreholes']}, "
+        f"фолдов: {report['folds']}, переобучено фолдов: {report['refitted']}"
+    )
+    print(f"Эталонный профиль: MAE {baseline['mae']:.3f}, RMSE {baseline['rmse']:.3f}")
+    for row in report["candidates"]:
+        params = ", ".join(f"{name}={value}" for name, value in row["params"].items())
+        print(
+            f"{params:<50} MAE {row['mae']:.3f} RMSE {row['rmse']:.3f}"
+            f"±{row['rmse_std']:.3f} обучение {row['fit_s']:.2f} с "
+            f"прогноз {row['predict_us_per_row']:.1f} мкс/замер"
+            f"{' *' if row['pareto'] else ''}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,55 @@
 # Создаём файл excel_parser.py
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import streamlit as st
+
+from utils.lithology import (
+    LITHOLOGY_TYPES,
+    normalize_lithology,
+    normalize_lithology_column,
+)
+from utils.timing import timed
+
+# Колонка с нормализованным грунтом (pd.Categorical), добавляется при разборе
+LITHOLOGY_COLUMN = "Грунт"
+
+# Размер порции строк при потоковом чтении больших журналов
+STREAM_CHUNK_SIZE = 5000
+
+# Компактные типы колонок при потоковом чтении
+DEPTH_COLUMNS = ["Глубина от, м", "Глубина до, м", "Мощность, м"]
+TEXT_COLUMNS = ["Интервалы керна", "Литология", "Описание"]
+# Колонки, которые при потоковом чтении хранятся категориями
+CATEGORY_COLUMNS = ["Скважина"] + TEXT_COLUMNS
+
+# Суффикс ключа кэша для журналов, разобранных потоково
+STREAM_CACHE_SUFFIX = "-stream"
+
+# Необязательные координаты устья скважины (плоские, м) - для выбора
+# ближайших эталонных термограмм
+COORDINATE_COLUMNS = ["X, м", "Y, м"]
+
+# Кэш разобранных журналов: хэш содержимого файла -> DataFrame.
+# Общий для всех сессий процесса, хранит последние PARSE_CACHE_SIZE файлов
+PARSE_CACHE_SIZE = 8
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+# Индексы скважин для разобранных журналов: id(DataFrame) -> (DataFrame, индекс)
+_index_cache = OrderedDict()
 
 
 class BoreholeDataParser:
-    def __init__(self):
+    def __init__(self, cache_dir=None):
+        # Папка для кэша на диске (например, "data/cache"), None - только память
+        self.cache_dir = cache_dir
+        self.last_file_hash = None
+
         self.expected_columns = [
             "Скважина",
             "Глубина от, м",
@@ -16,88 +61,468 @@ class BoreholeDataParser:
             "Дата создания",
         ]
 
+    @timed("parser.parse_excel_data")
     def parse_excel_data(self, uploaded_file):
         """
-        Парсим данные из Excel файла бурового журнала
+        Парсим данные из Excel файла бурового журнала.
+        Результат кэшируется по хэшу содержимого файла.
+        Ошибка чтения или нет нужных колонок - ValueError (показывает вызывающий)
         """
         try:
-            df = pd.read_excel(uploaded_file)
+            content = self.read_file_bytes(uploaded_file)
+            file_hash = hashlib.sha256(content).hexdigest()
+            self.last_file_hash = file_hash
+
+            df = self.load_cached(file_hash)
+            if df is not None:
+                return df
+
+            with timed("parser.read_excel"):
+                df = pd.read_excel(io.BytesIO(content))
 
             # Проверяем наличие нужных колонок
             missing_cols = [
                 col for col in self.expected_columns if col not in df.columns
             ]
             if missing_cols:
-                st.error(f"В файле отсутствуют колонки: {missing_cols}")
-                return None
+                raise ValueError(f"В файле отсутствуют колонки: {missing_cols}")
+
+            # Колонки со смешанными типами (числа и текст) приводим к тексту,
+            # иначе их не сохранить в Parquet
+            for col in df.columns[df.dtypes == object]:
+                values = df[col]
+                df[col] = values.where(values.isna(), values.astype(str))
+
+            df[LITHOLOGY_COLUMN] = normalize_lithology_column(df["Литология"])
+
+            self.store_cached(file_hash, df)
+            return df
+        except Exception as e:
+            raise ValueError(f"Ошибка чтения файла: {e}") from e
+
+    @timed("parser.parse_streaming")
+    def parse_streaming(self, uploaded_file, on_chunk=None):
+        """
+        Потоковый разбор большого журнала (xlsx или csv) порциями по
+        STREAM_CHUNK_SIZE строк. Порции сразу складываются в компактные
+        массивы по колонкам (JournalColumns), поэтому в памяти одновременно
+        только одна порция исходных строк. on_chunk(chunk, rows_read)
+        вызывается после каждой порции - например, для индикатора прогресса.
+        Ошибки - ValueError, как в parse_excel_data
+        """
+        try:
+            file_hash = self.file_hash(uploaded_file)
+            # Типы колонок отличаются от parse_excel_data, кэш - отдельный
+            cache_key = f"{file_hash}{STREAM_CACHE_SUFFIX}"
+            self.last_file_hash = cache_key
+
+            df = self.load_cached(cache_key)
+            if df is not None:
+                return df
+
+            columns = JournalColumns()
+            for chunk in self.iter_journal_chunks(uploaded_file):
+                columns.append(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk, columns.rows)
+                del chunk
 
+            if not columns.rows:
+                columns.append(
+                    self.build_chunk({col: [] for col in self.expected_columns})
+                )
+            df = columns.frame()
+
+            self.store_cached(cache_key, df)
             return df
         except Exception as e:
-            st.error(f"Ошибка чтения файла: {e}")
+            raise ValueError(f"Ошибка чтения файла: {e}") from e
+
+    def iter_journal_chunks(self, uploaded_file, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Генератор порций журнала с компактными типами колонок.
+        Заголовок проверяется сразу, до чтения строк данных
+        """
+        name = getattr(uploaded_file, "name", uploaded_file)
+        if isinstance(name, (str, os.PathLike)) and str(name).lower().endswith(".csv"):
+            reader = pd.read_csv(uploaded_file, chunksize=chunk_size, dtype=object)
+            first = next(reader, None)
+            header = [] if first is None else list(first.columns)
+            self.check_columns(header)
+            return self._iter_csv_chunks(first, reader)
+
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        self.check_columns(header)
+        return self._iter_excel_chunks(workbook, rows, header, chunk_size)
+
+    def check_columns(self, header):
+        missing_cols = [col for col in self.expected_columns if col not in header]
+        if missing_cols:
+            raise ValueError(f"В файле отсутствуют колонки: {missing_cols}")
+
+    def _iter_csv_chunks(self, first, reader):
+        if first is None:
+            return
+        yield self.build_chunk(first)
+        for chunk in reader:
+            yield self.build_chunk(chunk)
+
+    def _iter_excel_chunks(self, workbook, rows, header, chunk_size):
+        columns = self.expected_columns + [
+            col for col in COORDINATE_COLUMNS if col in header
+        ]
+        positions = [header.index(col) for col in columns]
+        try:
+            buffer = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                buffer.append(row)
+                if len(buffer) >= chunk_size:
+                    yield self.build_chunk(
+                        self._rows_to_columns(buffer, columns, positions)
+                    )
+                    buffer = []
+            if buffer:
+                yield self.build_chunk(
+                    self._rows_to_columns(buffer, columns, positions)
+                )
+        finally:
+            workbook.close()
+
+    def _rows_to_columns(self, rows, columns, positions):
+        values = {}
+        for col, pos in zip(columns, positions):
+            values[col] = [row[pos] if pos < len(row) else None for row in rows]
+        return values
+
+    def build_chunk(self, columns):
+        """
+        Порция журнала: глубины - float64 (как в parse_excel_data, иначе
+        глубина на подошве слоя попадает в соседний слой), текст - строками
+        """
+        chunk = pd.DataFrame({"Скважина": pd.Series(columns["Скважина"], dtype=object)})
+        for col in DEPTH_COLUMNS:
+            chunk[col] = pd.to_numeric(
+                pd.Series(columns[col], dtype=object), errors="coerce"
+            ).astype(float)
+        for col in TEXT_COLUMNS:
+            values = pd.Series(columns[col], dtype=object)
+            chunk[col] = values.where(values.isna(), values.astype(str))
+        chunk["Дата создания"] = pd.to_datetime(
+            pd.Series(columns["Дата создания"], dtype=object),
+            errors="coerce",
+            dayfirst=True,
+        )
+        chunk[LITHOLOGY_COLUMN] = normalize_lithology_column(chunk["Литология"])
+
+        coordinate_columns = [col for col in COORDINATE_COLUMNS if col in columns]
+        for col in coordinate_columns:
+            chunk[col] = pd.to_numeric(
+                pd.Series(columns[col], dtype=object), errors="coerce"
+            )
+        return chunk[self.expected_columns + [LITHOLOGY_COLUMN] + coordinate_columns]
+
+    def file_hash(self, uploaded_file):
+        """Хэш содержимого файла, путь на диске читается блоками"""
+        if isinstance(uploaded_file, (str, os.PathLike)):
+            digest = hashlib.sha256()
+            with open(uploaded_file, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+
+        return hashlib.sha256(self.read_file_bytes(uploaded_file)).hexdigest()
+
+    def read_file_bytes(self, uploaded_file):
+        """Содержимое файла: загруженный в Streamlit файл, путь или поток"""
+        if hasattr(uploaded_file, "getvalue"):
+            return uploaded_file.getvalue()
+        if isinstance(uploaded_file, (str, os.PathLike)):
+            with open(uploaded_file, "rb") as f:
+                return f.read()
+
+        content = uploaded_file.read()
+        uploaded_file.seek(0)
+        return content
+
+    def cache_path(self, file_hash):
+        return os.path.join(self.cache_dir, f"{file_hash}.parquet")
+
+    def load_cached(self, file_hash):
+        """Разобранный журнал из кэша в памяти или на диске, иначе None"""
+        with _parse_cache_lock:
+            if file_hash in _parse_cache:
+                _parse_cache.move_to_end(file_hash)
+                return _parse_cache[file_hash]
+
+        if self.cache_dir is None or not os.path.exists(self.cache_path(file_hash)):
             return None
 
+        try:
+            df = pd.read_parquet(self.cache_path(file_hash))
+        except Exception:
+            # Нет pyarrow или файл кэша повреждён - просто читаем Excel заново
+            return None
+
+        self.remember(file_hash, df)
+        return df
+
+    def store_cached(self, file_hash, df):
+        self.remember(file_hash, df)
+
+        if self.cache_dir is None:
+            return
+
+        path = self.cache_path(file_hash)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            # Кэш на диске необязателен (нет pyarrow, смешанные типы в колонках)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def remember(self, file_hash, df):
+        with _parse_cache_lock:
+            _parse_cache[file_hash] = df
+            _parse_cache.move_to_end(file_hash)
+            while len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+
     def get_boreholes_list(self, df):
         """Получаем список скважин из данных"""
         return df["Скважина"].unique().tolist()
 
+    @timed("parser.get_layers_for_borehole")
     def get_layers_for_borehole(self, df, borehole_id):
         """Получаем слои для конкретной скважины"""
-        borehole_data = df[df["Скважина"] == borehole_id].copy()
-        borehole_data = borehole_data.sort_values("Глубина от, м")
-
-        layers = []
-        for _, row in borehole_data.iterrows():
-            layers.append(
-                {
-                    "depth_from": row["Глубина от, м"],
-                    "depth_to": row["Глубина до, м"],
-                    "thickness": row["Мощность, м"],
-                    "lithology": self.map_lithology(row["Литология"]),
-                    "description": row["Описание"],
-                    "core_intervals": row["Интервалы керна"],
-                }
-            )
+        return self.get_index(df).layers(borehole_id)
+
+    def get_index(self, df):
+        """Индекс скважин журнала, строится один раз на DataFrame"""
+        key = id(df)
+        with _parse_cache_lock:
+            if key in _index_cache and _index_cache[key][0] is df:
+                _index_cache.move_to_end(key)
+                return _index_cache[key][1]
+
+        with timed("parser.build_index"):
+            index = BoreholeIndex(df)
 
-        return layers
+        with _parse_cache_lock:
+            # Храним и сам DataFrame, чтобы его id не достался другому объекту
+            _index_cache[key] = (df, index)
+            _index_cache.move_to_end(key)
+            while len(_index_cache) > PARSE_CACHE_SIZE:
+                _index_cache.popitem(last=False)
 
+        return index
 
-    # excel_parser.py - обновляем функцию map_lithology
     def map_lithology(self, lithology_name):
         """
-        УЛУЧШЕННОЕ приведение названий грунтов к стандартным типам
+        Приведение названий грунтов к стандартным типам
+        """
+        return normalize_lithology(lithology_name)
+
+
+class FirstBorehole:
+    """
+    Слои первой скважины потокового журнала: готовы, как только в порциях
+    появилась следующая скважина (строки журнала идут по скважинам).
+    Позволяет показать скважину до того, как прочитан весь файл
+    """
+
+    def __init__(self):
+        self.borehole = None
+        # Слои в формате get_layers_for_borehole, когда скважина прочитана
+        self.layers = None
+        self._parts = []
+
+    def add(self, chunk):
+        """Добавляем порцию; True - первая скважина только что стала полной"""
+        if self.layers is not None:
+            return False
+        chunk = chunk[chunk["Скважина"].notna()]
+        if chunk.empty:
+            return False
+        if self.borehole is None:
+            self.borehole = chunk["Скважина"].iloc[0]
+
+        others = np.flatnonzero((chunk["Скважина"] != self.borehole).to_numpy())
+        if not len(others):
+            self._parts.append(chunk)
+            return False
+
+        self._parts.append(chunk.iloc[: others[0]])
+        frame = pd.concat(self._parts, ignore_index=True)
+        self._parts = []
+        self.layers = BoreholeIndex(frame).layers(self.borehole)
+        return True
+
+
+class JournalColumns:
+    """
+    Порции журнала, сложенные по колонкам: числа и даты - массивами,
+    текст - кодами категорий с общим для всех порций
+    словарём значений (в журналах описания и номера скважин повторяются)
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.rows = 0
+        self._parts = {}
+        # Колонка -> {значение: код категории}
+        self._categories = {}
+
+    def append(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        for col in self.columns:
+            values = chunk[col]
+            if col in CATEGORY_COLUMNS:
+                values = self._category_codes(col, values)
+            elif col == LITHOLOGY_COLUMN:
+                values = np.asarray(values.cat.codes, dtype=np.int8)
+            else:
+                values = values.to_numpy()
+            self._parts.setdefault(col, []).append(values)
+        self.rows += len(chunk)
+
+    def _category_codes(self, col, values):
+        codes, uniques = pd.factorize(values)
+        lookup = self._categories.setdefault(col, {})
+        # Последний элемент - для пропусков (код -1)
+        mapping = np.array(
+            [lookup.setdefault(value, len(lookup)) for value in uniques] + [-1],
+            dtype=np.int32,
+        )
+        return mapping[codes]
+
+    def frame(self):
+        """DataFrame из накопленных колонок (колонки склеиваются по одной)"""
+        data = {}
+        for col in self.columns:
+            values = np.concatenate(self._parts.pop(col))
+            if col in self._categories:
+                values = pd.Categorical.from_codes(
+                    values, categories=list(self._categories.pop(col))
+                )
+            elif col == LITHOLOGY_COLUMN:
+                values = pd.Categorical.from_codes(values, categories=LITHOLOGY_TYPES)
+            data[col] = values
+        return pd.DataFrame(data, copy=False)
+
+
+class BoreholeIndex:
+    """
+    Слои журнала, сгруппированные по скважинам: для каждой скважины -
+    непрерывный блок массивов, отсортированный по глубине
+    """
+
+    def __init__(self, df):
+        borehole_codes, boreholes = pd.factorize(df["Скважина"])
+
+        if LITHOLOGY_COLUMN in df.columns:
+            lithologies = pd.Categorical(
+                df[LITHOLOGY_COLUMN], categories=LITHOLOGY_TYPES
+            )
+        else:
+            lithologies = normalize_lithology_column(df["Литология"])
+
+        depth_from = df["Глубина от, м"].to_numpy(dtype=float)
+
+        # Сортируем по скважине, внутри скважины - по глубине кровли слоя,
+        # строки без номера скважины (код -1) отбрасываем
+        order = np.lexsort((depth_from, borehole_codes))
+        order = order[borehole_codes[order] >= 0]
+        sorted_codes = borehole_codes[order]
+
+        self.boreholes = boreholes.tolist()
+        self.depth_from = depth_from[order]
+        self.depth_to = df["Глубина до, м"].to_numpy(dtype=float)[order]
+        self.thickness = df["Мощность, м"].to_numpy(dtype=float)[order]
+        self.lithology_codes = np.asarray(lithologies.codes, dtype=np.int8)[order]
+        self.descriptions = df["Описание"].to_numpy(dtype=object)[order]
+        self.core_intervals = df["Интервалы керна"].to_numpy(dtype=object)[order]
+
+        # Границы блоков: строки скважины i - [starts[i], stops[i])
+        block_ids = np.arange(len(self.boreholes))
+        self.starts = np.searchsorted(sorted_codes, block_ids, side="left")
+        self.stops = np.searchsorted(sorted_codes, block_ids, side="right")
+        self.positions = {borehole: i for i, borehole in enumerate(self.boreholes)}
+
+        # Координаты устья по первой строке скважины, NaN - без координат
+        self.locations = np.full((len(self.boreholes), 2), np.nan)
+        if all(col in df.columns for col in COORDINATE_COLUMNS):
+            coordinates = np.column_stack(
+                [
+                    pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+                    for col in COORDINATE_COLUMNS
+                ]
+            )[order]
+            has_rows = self.stops > self.starts
+            self.locations[has_rows] = coordinates[self.starts[has_rows]]
+
+    def block(self, borehole_id):
+        """Срез строк скважины в массивах индекса"""
+        i = self.positions[borehole_id]
+        return slice(self.starts[i], self.stops[i])
+
+    def layers(self, borehole_id):
+        """Слои скважины в виде списка словарей"""
+        if borehole_id not in self.positions:
+            return []
+
+        rows = self.block(borehole_id)
+        return [
+            {
+                "depth_from": depth_from,
+                "depth_to": depth_to,
+                "thickness": thickness,
+                "lithology": LITHOLOGY_TYPES[code],
+                "description": description,
+                "core_intervals": core_intervals,
+            }
+            for depth_from, depth_to, thickness, code, description, core_intervals in zip(
+                self.depth_from[rows].tolist(),
+                self.depth_to[rows].tolist(),
+                self.thickness[rows].tolist(),
+                self.lithology_codes[rows].tolist(),
+                self.descriptions[rows],
+                self.core_intervals[rows],
+            )
+        ]
+
+    def location(self, borehole_id):
+        """Координаты (x, y) скважины или None, если их нет в журнале"""
+        x, y = self.locations[self.positions[borehole_id]]
+        if np.isnan(x) or np.isnan(y):
+            return None
+        return float(x), float(y)
+
+    def max_depth(self, borehole_id):
+        """Глубина подошвы последнего слоя скважины"""
+        return float(self.depth_to[self.block(borehole_id)][-1])
+
+    def lithology_codes_at(self, borehole_id, depths):
+        """
+        Коды грунтов на глубинах: первый слой, подошва которого не выше
+        глубины; глубже последнего слоя - грунт последнего слоя
         """
-        if not isinstance(lithology_name, str):
-            return "суглинок"
-
-        lith_lower = lithology_name.lower().strip()
-
-        lithology_map = {
-            "торф": "торф",
-            "суглинок": "суглинок",
-            "супесь": "супесь",
-            "песок": "песок",
-            "прс": "прс",
-            "прп": "торф",
-            "растительный": "прс",
-            "мох": "прс",
-            "моховой": "прс",
-            "растительный слой": "прс",
-            "почва": "прс",
-        }
-
-        # Поиск по ключевым словам
-        for key, value in lithology_map.items():
-            if key in lith_lower:
-                return value
-
-        # Если не нашли, пытаемся определить по описанию
-        if "пес" in lith_lower:
-            return "песок"
-        elif "сугл" in lith_lower:
-            return "суглинок"
-        elif "супе" in lith_lower:
-            return "супесь"
-        elif "торф" in lith_lower:
-            return "торф"
-
-        return "суглинок"  # значение по умолчанию
+        rows = self.block(borehole_id)
+        depth_to = self.depth_to[rows]
+        positions = np.searchsorted(depth_to, np.asarray(depths, dtype=float))
+        positions = np.minimum(positions, len(depth_to) - 1)
+        return self.lithology_codes[rows][positions]
+
+    def lithologies_at(self, borehole_id, depths):
+        """Названия грунтов на глубинах"""
+        codes = self.lithology_codes_at(borehole_id, depths)
+        return np.array(LITHOLOGY_TYPES, dtype=object)[codes]
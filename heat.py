@@ -0,0 +1,265 @@
+"""
+Нестационарная одномерная теплопроводность по разрезу скважин.
+
+Неявная схема (Эйлер назад) на равномерной сетке по глубине. Фазовый
+переход вода-лёд учитывается эффективной теплоёмкостью в интервале
+[-PHASE_INTERVAL, 0] °C, коэффициенты берутся с предыдущего шага, поэтому
+на каждом шаге решается линейная трёхдиагональная система. Системы всех
+скважин складываются в одну блочно-трёхдиагональную и решаются одним
+вызовом LAPACK ptsv.
+"""
+
+import numpy as np
+
+from model import SEASON_MONTHS
+from utils.lithology import LITHOLOGY_CODES
+
+# Теплофизические свойства по кодам грунтов (порядок LITHOLOGY_TYPES):
+# теплопроводность, Вт/(м·К), объёмная теплоёмкость, Дж/(м³·К),
+# объёмная влажность, доли единицы
+CONDUCTIVITY_THAWED = np.array([0.40, 1.30, 1.50, 1.90, 0.50])
+CONDUCTIVITY_FROZEN = np.array([0.90, 1.60, 1.80, 2.20, 0.90])
+HEAT_CAPACITY_THAWED = np.array([3.0e6, 2.6e6, 2.4e6, 2.3e6, 2.8e6])
+HEAT_CAPACITY_FROZEN = np.array([2.0e6, 2.0e6, 1.9e6, 1.8e6, 2.0e6])
+WATER_CONTENT = np.array([0.80, 0.30, 0.22, 0.18, 0.50])
+
+# Теплота плавления льда на единицу объёма воды, Дж/м³
+LATENT_HEAT = 334e6
+# Интервал температур фазового перехода, °C
+PHASE_INTERVAL = 1.0
+
+# Геотермический поток снизу, Вт/м²
+GEOTHERMAL_FLUX = 0.05
+
+# Годовой ход температуры поверхности: амплитуда по умолчанию, °C,
+# и день года с минимальной температурой
+DEFAULT_AMPLITUDE = 15.0
+COLDEST_DAY = 20
+DAYS_PER_YEAR = 365.0
+SECONDS_PER_DAY = 86400.0
+
+
+class HeatSimulationResult:
+    """Температуры по времени (сутки), скважинам и глубинам"""
+
+    def __init__(self, times, depths, temperatures):
+        self.times = times
+        self.depths = depths
+        # temperatures[момент времени, скважина, глубина]
+        self.temperatures = temperatures
+
+    def last_year(self):
+        """Маска моментов последнего года расчёта"""
+        return self.times > self.times[-1] - DAYS_PER_YEAR
+
+    def seasonal_means(self):
+        """Средние профили по сезонам последнего года: сезон -> (скважины x глубины)"""
+        last_year = self.last_year()
+        months = (self.times % DAYS_PER_YEAR / DAYS_PER_YEAR * 12).astype(int) + 1
+
+        means = {}
+        for season, season_months in SEASON_MONTHS.items():
+            mask = last_year & np.isin(months, season_months)
+            if mask.any():
+                means[season] = self.temperatures[mask].mean(axis=0)
+        return means
+
+    def envelope(self):
+        """Минимальные и максимальные температуры за последний год"""
+        temperatures = self.temperatures[self.last_year()]
+        return temperatures.min(axis=0), temperatures.max(axis=0)
+
+    def thaw_depths(self):
+        """
+        Глубина сезонного протаивания за последний год по каждой скважине
+        (первая глубина, где максимум температуры не выше 0 °C)
+        """
+        _, maximum = self.envelope()
+        frozen = maximum <= 0
+        depths = np.where(
+            frozen.any(axis=1), self.depths[frozen.argmax(axis=1)], np.nan
+        )
+        return depths
+
+
+class HeatConductionSimulator:
+    """
+    Расчёт температур сразу для многих скважин. Разрез скважины - пара
+    массивов (подошвы слоёв по возрастанию, коды грунтов слоёв)
+    """
+
+    def __init__(
+        self,
+        max_depth=30.0,
+        dz=0.2,
+        dt_days=1.0,
+        geothermal_flux=GEOTHERMAL_FLUX,
+    ):
+        self.depths = np.arange(0.0, max_depth + dz / 2, dz)
+        self.dz = dz
+        self.dt_days = dt_days
+        self.geothermal_flux = geothermal_flux
+
+    @staticmethod
+    def stack_from_layers(layers):
+        """Разрез из списка слоёв BoreholeDataParser.get_layers_for_borehole"""
+        depth_to = np.array([layer["depth_to"] for layer in layers], dtype=float)
+        codes = np.array(
+            [LITHOLOGY_CODES[layer["lithology"]] for layer in layers], dtype=np.intp
+        )
+        return depth_to, codes
+
+    @staticmethod
+    def stacks_from_index(borehole_index, boreholes):
+        """Разрезы скважин из BoreholeIndex"""
+        stacks = []
+        for borehole in boreholes:
+            rows = borehole_index.block(borehole)
+            stacks.append(
+                (borehole_index.depth_to[rows], borehole_index.lithology_codes[rows])
+            )
+        return stacks
+
+    def node_codes(self, stacks):
+        """Коды грунтов в узлах сетки (скважины x глубины)"""
+        codes = np.empty((len(stacks), len(self.depths)), dtype=np.intp)
+        for i, (depth_to, layer_codes) in enumerate(stacks):
+            positions = np.searchsorted(depth_to, self.depths)
+            codes[i] = np.asarray(layer_codes)[np.minimum(positions, len(depth_to) - 1)]
+        return codes
+
+    def surface_temperature(self, day, mean_temps, amplitudes):
+        phase = 2 * np.pi * (day - COLDEST_DAY) / DAYS_PER_YEAR
+        return mean_temps - amplitudes * np.cos(phase)
+
+    def initial_profile(self, codes, mean_temps):
+        """
+        Стационарный профиль: среднегодовая температура плюс геотермический
+        градиент. Теплопроводность между узлами - среднее гармоническое, как
+        в simulate, поэтому мёрзлый разрез без годового хода не уходит с
+        этого профиля
+        """
+        k = CONDUCTIVITY_FROZEN[codes]
+        k_half = 2 * k[:, :-1] * k[:, 1:] / (k[:, :-1] + k[:, 1:])
+        profile = np.zeros(codes.shape)
+        profile[:, 1:] = np.cumsum(self.geothermal_flux * self.dz / k_half, axis=1)
+        return mean_temps[:, None] + profile
+
+    def simulate(
+        self,
+        stacks,
+        mean_surface_temps,
+        amplitudes=DEFAULT_AMPLITUDE,
+        years=1.0,
+        spinup_years=0.0,
+        initial_temps=None,
+        output_every_days=30.0,
+    ):
+        """
+        Расчёт на years лет (после spinup_years лет выхода на режим).
+        mean_surface_temps и amplitudes - скаляры или по значению на скважину.
+        Температуры сохраняются раз в output_every_days суток
+        """
+        from scipy.linalg import lapack
+
+        codes = self.node_codes(stacks)
+        n_boreholes, n_nodes = codes.shape
+        mean_temps = np.broadcast_to(
+            np.asarray(mean_surface_temps, dtype=float), (n_boreholes,)
+        )
+        amplitudes = np.broadcast_to(
+            np.asarray(amplitudes, dtype=float), (n_boreholes,)
+        )
+
+        if initial_temps is None:
+            temps = self.initial_profile(codes, mean_temps)
+        else:
+            temps = np.array(initial_temps, dtype=float)
+
+        k_frozen = CONDUCTIVITY_FROZEN[codes]
+        k_delta = CONDUCTIVITY_THAWED[codes] - k_frozen
+        c_frozen = HEAT_CAPACITY_FROZEN[codes]
+        c_delta = HEAT_CAPACITY_THAWED[codes] - c_frozen
+        latent = LATENT_HEAT * WATER_CONTENT[codes] / PHASE_INTERVAL
+
+        dt = self.dt_days * SECONDS_PER_DAY
+        r = dt / self.dz**2
+        flux_term = self.geothermal_flux * dt / self.dz
+
+        spinup_steps = int(round(spinup_years * DAYS_PER_YEAR / self.dt_days))
+        total_steps = spinup_steps + int(round(years * DAYS_PER_YEAR / self.dt_days))
+        output_every = max(1, int(round(output_every_days / self.dt_days)))
+
+        # Рабочие массивы выделяем один раз, шаг по времени считает на месте
+        thawed = np.empty_like(temps)
+        k = np.empty_like(temps)
+        c = np.empty_like(temps)
+        buffer = np.empty_like(temps)
+        k_half = np.empty((n_boreholes, n_nodes - 1))
+        off_diagonal = np.zeros((n_boreholes, n_nodes - 1))
+        diagonal = np.empty((n_boreholes, n_nodes - 1))
+        rhs = np.empty((n_boreholes, n_nodes - 1))
+
+        times = []
+        outputs = []
+        for step in range(1, total_steps + 1):
+            # Календарные сутки: выход на режим - до нулевых суток
+            day = (step - spinup_steps) * self.dt_days
+
+            # Доля талой воды и эффективные свойства по температуре прошлого шага
+            np.add(temps, PHASE_INTERVAL, out=thawed)
+            thawed *= 1.0 / PHASE_INTERVAL
+            np.clip(thawed, 0.0, 1.0, out=thawed)
+            np.multiply(thawed, k_delta, out=k)
+            k += k_frozen
+            np.multiply(thawed, c_delta, out=c)
+            c += c_frozen
+            np.multiply(latent, (thawed > 0) & (thawed < 1), out=buffer)
+            c += buffer
+
+            # Теплопроводность между соседними узлами (среднее гармоническое),
+            # сразу умноженная на dt/dz²
+            np.multiply(k[:, :-1], k[:, 1:], out=k_half)
+            np.add(k[:, :-1], k[:, 1:], out=buffer[:, 1:])
+            k_half /= buffer[:, 1:]
+            k_half *= 2 * r
+
+            # Неизвестные - узлы 1..N, в узле 0 задана температура поверхности.
+            # Строку нижнего узла (полуячейка с потоком снизу) делим на 2,
+            # чтобы матрица была симметричной: решаем LDLᵀ без выбора ведущего
+            np.add(k_half[:, :-1], k_half[:, 1:], out=diagonal[:, :-1])
+            diagonal[:, :-1] += c[:, 1:-1]
+            diagonal[:, -1] = 0.5 * c[:, -1] + k_half[:, -1]
+            # Блоки скважин не связаны между собой (последний элемент - ноль)
+            np.negative(k_half[:, 1:], out=off_diagonal[:, :-1])
+            off_diagonal[:, -1] = 0.0
+
+            surface = self.surface_temperature(day, mean_temps, amplitudes)
+            np.multiply(c[:, 1:], temps[:, 1:], out=rhs)
+            rhs[:, 0] += k_half[:, 0] * surface
+            rhs[:, -1] *= 0.5
+            rhs[:, -1] += flux_term
+
+            _, _, solution, info = lapack.dptsv(
+                diagonal.ravel(),
+                off_diagonal.ravel()[:-1],
+                rhs.reshape(-1, 1),
+                overwrite_d=1,
+                overwrite_e=1,
+                overwrite_b=1,
+            )
+            if info != 0:
+                raise RuntimeError(f"Ошибка решения системы (LAPACK info={info})")
+
+            temps[:, 0] = surface
+            temps[:, 1:] = solution.reshape(n_boreholes, n_nodes - 1)
+
+            if step > spinup_steps and (step - spinup_steps) % output_every == 0:
+                times.append(day)
+                outputs.append(temps.astype(np.float32))
+
+        return HeatSimulationResult(
+            np.array(times),
+            self.depths,
+            np.array(outputs).reshape(len(outputs), n_boreholes, n_nodes),
+        )
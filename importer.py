@@ -0,0 +1,334 @@
+"""
+Потоковый импорт данных термокос (логгеров) в замеры для обучения.
+
+Запуск из корня проекта:
+    python -m importer logger.csv --journal journal.xlsx [--period 1D]
+        [--chunk-size 200000] [--force] [--train]
+
+CSV логгера: скважина, глубина датчика, время, температура и, если есть,
+температура поверхности. Файл читается порциями, поэтому память не
+зависит от его размера. Показания одного датчика усредняются по периодам
+(по умолчанию сутки), повторные строки отбрасываются. Сезон берётся из
+времени, грунт - из слоёв скважины в буровом журнале. Температура
+поверхности - из колонки, а без неё - показание самого верхнего датчика
+скважины за тот же период. Строки каждой скважины должны идти по
+времени (скважины могут идти и подряд, одна за другой): строки уже
+записанных периодов скважины отбрасываются и считаются опоздавшими.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from excel_parser import BoreholeDataParser
+from model import SEASON_BY_MONTH, PermafrostModel
+
+# Колонки CSV логгера по умолчанию (surface_temp необязательна)
+LOGGER_COLUMNS = {
+    "borehole": "borehole",
+    "depth": "depth",
+    "timestamp": "timestamp",
+    "temperature": "temperature",
+    "surface_temp": "surface_temp",
+}
+REQUIRED_COLUMNS = ["borehole", "depth", "timestamp", "temperature"]
+
+IMPORT_CHUNK_SIZE = 200000
+# Период усреднения показаний датчика (строка частоты pandas)
+DOWNSAMPLE_PERIOD = "1D"
+
+BUCKET_KEYS = ["borehole", "depth", "bucket"]
+ROW_KEYS = ["borehole", "depth", "timestamp"]
+
+
+class LoggerImporter:
+    """
+    Импорт CSV логгеров в базу замеров модели. borehole_index - индекс
+    бурового журнала (BoreholeIndex), по нему определяется грунт датчика
+    """
+
+    def __init__(
+        self,
+        model,
+        borehole_index,
+        period=DOWNSAMPLE_PERIOD,
+        chunk_size=IMPORT_CHUNK_SIZE,
+        columns=None,
+    ):
+        self.model = model
+        self.index = borehole_index
+        self.period = period
+        self.chunk_size = chunk_size
+        self.columns = {**LOGGER_COLUMNS, **(columns or {})}
+        # Номер скважины логгера (текстом) -> номер в журнале
+        self.boreholes = {str(borehole): borehole for borehole in self.index.boreholes}
+
+    def import_file(self, path, force=False):
+        """
+        Импорт файла. Уже загруженный файл (по хэшу содержимого)
+        пропускается, если не force. Возвращает статистику импорта
+        """
+        stats = {
+            "rows": 0,
+            "invalid_rows": 0,
+            "duplicate_rows": 0,
+            "late_rows": 0,
+            "unknown_borehole_samples": 0,
+            "samples": 0,
+            "skipped": False,
+        }
+        file_hash = BoreholeDataParser().file_hash(path)
+        if not force and self.model.store.is_imported(file_hash):
+            stats["skipped"] = True
+            return stats
+        if hasattr(path, "seek"):
+            path.seek(0)
+
+        for samples in self.iter_samples(path, stats):
+            stats["samples"] += self.append(samples, stats)
+
+        source = getattr(path, "name", path)
+        self.model.store.record_import(
+            file_hash, os.path.basename(str(source)), stats["samples"]
+        )
+        return stats
+
+    def iter_samples(self, path, stats=None):
+        """
+        Генератор усреднённых замеров (DataFrame: borehole, depth, bucket,
+        temperature, surface_temp). Периоды скважины выдаются, как только
+        её строки ушли дальше них по времени
+        """
+        stats = stats if stats is not None else {}
+        for key in ("rows", "invalid_rows", "duplicate_rows", "late_rows"):
+            stats.setdefault(key, 0)
+
+        header = pd.read_csv(path, nrows=0).columns
+        if hasattr(path, "seek"):
+            # Загруженный файл (поток) читаем заново с начала
+            path.seek(0)
+        names = {self.columns[key]: key for key in LOGGER_COLUMNS}
+        missing = [
+            self.columns[key]
+            for key in REQUIRED_COLUMNS
+            if self.columns[key] not in header
+        ]
+        if missing:
+            raise ValueError(f"В файле логгера отсутствуют колонки: {missing}")
+        usecols = [column for column in names if column in header]
+
+        pending = None
+        # Начало ещё не записанных периодов по скважинам и строки этих
+        # периодов (для поиска повторов)
+        watermarks = pd.Series(dtype="datetime64[ns]")
+        open_rows = None
+        reader = pd.read_csv(
+            path,
+            usecols=usecols,
+            chunksize=self.chunk_size,
+            dtype={self.columns["borehole"]: str},
+        )
+        for chunk in reader:
+            chunk = chunk.rename(columns=names)
+            stats["rows"] += len(chunk)
+            chunk = self.clean_chunk(chunk, stats)
+            chunk = self.drop_repeated(chunk, watermarks, open_rows, stats)
+            if chunk.empty:
+                continue
+
+            pending = self.aggregate(chunk, pending)
+            rows = chunk[ROW_KEYS + ["bucket"]]
+            open_rows = rows if open_rows is None else pd.concat([open_rows, rows])
+
+            # Периоды скважины раньше её последнего периода уже не пополнятся
+            chunk_marks = chunk.groupby("borehole", sort=False)["bucket"].max()
+            watermarks = pd.concat([watermarks, chunk_marks]).groupby(level=0).max()
+            closed = pending.index.get_level_values(
+                "bucket"
+            ) < pending.index.get_level_values("borehole").map(watermarks)
+            if closed.any():
+                yield self.finish(pending[closed])
+                pending = pending[~closed]
+                open_rows = open_rows[
+                    open_rows["bucket"] >= open_rows["borehole"].map(watermarks)
+                ]
+
+        if pending is not None and len(pending):
+            yield self.finish(pending)
+
+    def clean_chunk(self, chunk, stats):
+        """Типы колонок, отбрасываем неполные и повторные строки"""
+        chunk["borehole"] = chunk["borehole"].str.strip()
+        chunk["depth"] = pd.to_numeric(chunk["depth"], errors="coerce")
+        chunk["temperature"] = pd.to_numeric(chunk["temperature"], errors="coerce")
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], errors="coerce")
+        if "surface_temp" in chunk:
+            chunk["surface_temp"] = pd.to_numeric(
+                chunk["surface_temp"], errors="coerce"
+            )
+
+        valid = chunk[REQUIRED_COLUMNS].notna().all(axis=1)
+        stats["invalid_rows"] += int((~valid).sum())
+        chunk = chunk[valid]
+
+        duplicated = chunk.duplicated(["borehole", "depth", "timestamp"])
+        stats["duplicate_rows"] += int(duplicated.sum())
+        chunk = chunk[~duplicated].copy()
+
+        chunk["bucket"] = chunk["timestamp"].dt.floor(self.period)
+        return chunk
+
+    def drop_repeated(self, chunk, watermarks, open_rows, stats):
+        """
+        Отбрасываем строки, уже учтённые прошлыми порциями: периоды
+        скважины раньше её watermarks записаны (опоздавшие строки), строки
+        открытых периодов есть в open_rows (повторы)
+        """
+        if open_rows is None or chunk.empty:
+            return chunk
+        late = (chunk["bucket"] < chunk["borehole"].map(watermarks)).to_numpy()
+        repeated = pd.MultiIndex.from_frame(chunk[ROW_KEYS]).isin(
+            pd.MultiIndex.from_frame(open_rows[ROW_KEYS])
+        )
+        stats["late_rows"] += int(late.sum())
+        stats["duplicate_rows"] += int((repeated & ~late).sum())
+        return chunk[~(late | repeated)]
+
+    def aggregate(self, chunk, pending=None):
+        """
+        Суммы и число показаний по (скважина, глубина, период), вместе с
+        ещё не закрытыми периодами прошлых порций
+        """
+        chunk = chunk.assign(count=1)
+        sums = {"temperature": "sum", "count": "sum"}
+        if "surface_temp" in chunk:
+            chunk["surface_count"] = chunk["surface_temp"].notna().astype(int)
+            chunk["surface_temp"] = chunk["surface_temp"].fillna(0.0)
+            sums.update({"surface_temp": "sum", "surface_count": "sum"})
+
+        grouped = chunk.groupby(BUCKET_KEYS, sort=False).agg(sums)
+        if pending is None or pending.empty:
+            return grouped
+        return (
+            pd.concat([pending, grouped]).groupby(level=BUCKET_KEYS, sort=False).sum()
+        )
+
+    def finish(self, sums):
+        """Средние за период и температура поверхности для замеров"""
+        samples = sums.reset_index()
+        samples["temperature"] = samples["temperature"] / samples["count"]
+
+        # Поверхность - по самому верхнему датчику скважины за период
+        shallowest = (
+            samples.sort_values("depth")
+            .groupby(["borehole", "bucket"], sort=False)["temperature"]
+            .transform("first")
+        )
+        if "surface_temp" in samples:
+            measured = samples["surface_temp"] / samples["surface_count"].where(
+                samples["surface_count"] > 0
+            )
+            samples["surface_temp"] = measured.fillna(shallowest)
+        else:
+            samples["surface_temp"] = shallowest
+
+        return samples[BUCKET_KEYS + ["temperature", "surface_temp"]]
+
+    def append(self, samples, stats=None):
+        """
+        Кодируем замеры (грунт по журналу, сезон по периоду) и добавляем
+        в базу одной транзакцией. Скважины, которых нет в журнале,
+        пропускаются. Возвращает число добавленных замеров
+        """
+        known = samples["borehole"].isin(self.boreholes.keys())
+        if stats is not None:
+            stats["unknown_borehole_samples"] += int((~known).sum())
+        samples = samples[known]
+        if samples.empty:
+            return 0
+
+        lithology_codes = np.empty(len(samples), dtype=np.int8)
+        labels = samples["borehole"].to_numpy()
+        depths = samples["depth"].to_numpy(dtype=float)
+        for borehole in np.unique(labels):
+            rows = labels == borehole
+            lithology_codes[rows] = self.index.lithology_codes_at(
+                self.boreholes[borehole], depths[rows]
+            )
+
+        season_codes = SEASON_BY_MONTH[samples["bucket"].dt.month.to_numpy()]
+        return self.model.add_training_batch(
+            depths,
+            lithology_codes,
+            samples["surface_temp"].to_numpy(dtype=float),
+            season_codes,
+            np.round(samples["temperature"].to_numpy(dtype=float), 3),
+            boreholes=[str(self.boreholes[borehole]) for borehole in labels],
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Импорт данных термокос в замеры для обучения"
+    )
+    parser.add_argument("logger", nargs="+", help="CSV файлы логгеров")
+    parser.add_argument("--journal", required=True, help="Буровой журнал (.xlsx/.csv)")
+    parser.add_argument("--period", default=DOWNSAMPLE_PERIOD, help="Период усреднения")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    for key in LOGGER_COLUMNS:
+        parser.add_argument(
+            f"--{key.replace('_', '-')}-column",
+            dest=f"{key}_column",
+            default=LOGGER_COLUMNS[key],
+            help=f"Колонка {key} в CSV логгера",
+        )
+    parser.add_argument("--force", action="store_true", help="Загрузить повторно")
+    parser.add_argument("--train", action="store_true", help="Дообучить модель")
+    args = parser.parse_args(argv)
+
+    journal_parser = BoreholeDataParser()
+    try:
+        if args.journal.lower().endswith(".csv"):
+            df = journal_parser.parse_streaming(args.journal)
+        else:
+            df = journal_parser.parse_excel_data(args.journal)
+    except ValueError as e:
+        print(f"Не удалось прочитать журнал {args.journal}: {e}", file=sys.stderr)
+        return 1
+
+    model = PermafrostModel()
+    importer = LoggerImporter(
+        model,
+        journal_parser.get_index(df),
+        period=args.period,
+        chunk_size=args.chunk_size,
+        columns={key: getattr(args, f"{key}_column") for key in LOGGER_COLUMNS},
+    )
+    for path in args.logger:
+        try:
+            stats = importer.import_file(path, force=args.force)
+        except ValueError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            return 1
+        if stats["skipped"]:
+            print(f"{path}: уже загружен (--force для повторной загрузки)")
+            continue
+        print(
+            f"{path}: строк {stats['rows']}, замеров добавлено {stats['samples']} "
+            f"(неполных строк {stats['invalid_rows']}, повторов "
+            f"{stats['duplicate_rows']}, опоздавших строк {stats['late_rows']}, "
+            f"замеров вне журнала {stats['unknown_borehole_samples']})"
+        )
+
+    if args.train:
+        success, message = model.train_ml_model(incremental=True)
+        print(message)
+        return 0 if success else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,126 @@
-import pandas as pd
 import numpy as np
-from scipy import interpolate
-from sklearn.ensemble import RandomForestRegressor
-import joblib
+import copy
 import os
+import threading
+
+from database import FEATURE_COLUMNS, MeasurementStore
+from models.registry import ModelRegistry
+from references import (
+    BUILTIN_REFERENCE,
+    BUILTIN_REFERENCE_FILE,
+    REFERENCES_DIR,
+    ReferenceLibrary,
+    load_profile,
+)
+from utils.lithology import (
+    DEFAULT_LITHOLOGY_CODE,
+    LITHOLOGY_CODES,
+    LITHOLOGY_TYPES,
+    encode_lithologies,
+    lithology_code,
+    normalize_lithology,
+)
+from utils.timing import count, timed
+
+# Коды сезонов (совпадают с кодировкой признаков ML модели)
+SEASON_CODES = {"зима": 0, "весна": 1, "лето": 2, "осень": 3}
+
+# Сезоны по месяцам (1-12)
+SEASON_MONTHS = {
+    "зима": (12, 1, 2),
+    "весна": (3, 4, 5),
+    "лето": (6, 7, 8),
+    "осень": (9, 10, 11),
+}
+
+# Код сезона по номеру месяца (индекс 0 не используется)
+SEASON_BY_MONTH = np.zeros(13, dtype=np.int8)
+for _season, _months in SEASON_MONTHS.items():
+    SEASON_BY_MONTH[list(_months)] = SEASON_CODES[_season]
+
+# Параллельность пакетного прогноза ML модели
+ML_PREDICT_JOBS = -1
+ML_PARALLEL_MIN_ROWS = 2000
+
+# Размер леса и правила дообучения (доля новых замеров от уже учтённых)
+ML_BASE_TREES = 50
+ML_MAX_TREES = 200
+INCREMENTAL_MIN_GROWTH = 0.05
+FULL_RETRAIN_GROWTH = 0.5
+
+# Стандартные глубины замеров, м
+STANDARD_DEPTHS = [
+    0,
+    0.5,
+    1,
+    1.5,
+    2,
+    2.5,
+    3,
+    3.5,
+    4,
+    4.5,
+    5,
+    6,
+    7,
+    8,
+    9,
+    10,
+    12,
+    14,
+    16,
+    18,
+    20,
+    24,
+    26,
+    30,
+]
+
+# Глубины изломов кривой затухания влияния поверхности (get_surface_influence)
+SURFACE_INFLUENCE_BREAKS = [1.0, 5.0, 9.0]
+
+# Погрешность сравнения с порогом, °C: концы отрезков получаются продолжением
+# прямой, и температура, равная порогу, может отличаться от него на ошибку
+# округления
+CROSSING_TOLERANCE = 1e-9
+
+# Сколько скважин считать за один проход в borehole_state_depths
+STATE_DEPTHS_CHUNK = 2000
+
+# Состояния грунта, код состояния - индекс в списке
+GROUND_STATES = ["твёрдомёрзлый", "пластичномёрзлый", "охлаждённый", "талый"]
+
+# Пороговые температуры состояний, индекс - код грунта
+HARD_FROZEN_TEMPS = np.array([-0.50, -1.00, -0.60, -0.10, -0.30])
+PLASTIC_FROZEN_MIN = np.array([-0.49, -0.99, -0.59, -0.29, -0.29])
+PLASTIC_FROZEN_MAX = np.array([-0.21, -0.26, -0.21, -0.11, -0.11])
+
+# Температура, ниже которой грунт в данном состоянии или холоднее
+STATE_THRESHOLDS = {
+    "твёрдомёрзлый": HARD_FROZEN_TEMPS,
+    "пластичномёрзлый": PLASTIC_FROZEN_MAX,
+    "охлаждённый": np.zeros(len(HARD_FROZEN_TEMPS)),
+}
+
+
+def check_codes(codes, n_codes, name):
+    """Готовые коды должны быть в диапазоне 0..n_codes-1, иначе ValueError"""
+    codes = np.asarray(codes)
+    if codes.size and (codes.min() < 0 or codes.max() >= n_codes):
+        unknown = np.unique(codes[(codes < 0) | (codes >= n_codes)])
+        raise ValueError(
+            f"Неизвестные коды {name}: {unknown.tolist()} "
+            f"(допустимы 0..{n_codes - 1})"
+        )
 
 
 class PermafrostModel:
-    def __init__(self):
+    def __init__(
+        self,
+        store=None,
+        registry=None,
+        references=None,
+    ):
         # Базовые параметры
         self.ground_params = {
             "прс": {"type": "seasonal"},
@@ -17,96 +130,213 @@ class PermafrostModel:
             "песок": {"type": "permafrost"},
         }
 
-        # РЕАЛЬНЫЕ ДАННЫЕ ИЗ ВАШЕГО ЖУРНАЛА (средние значения)
+        # РЕАЛЬНЫЕ ДАННЫЕ ИЗ ВАШЕГО ЖУРНАЛА (средние значения): термограмма
+        # K36T из библиотеки эталонов (data/references/K36T.csv)
+        reference_depths, reference_temps = load_profile(BUILTIN_REFERENCE_FILE)
         self.reference_profile = {
-            "depth": [
-                0,
-                0.5,
-                1.0,
-                1.5,
-                2.0,
-                2.5,
-                3.0,
-                3.5,
-                4.0,
-                4.5,
-                5.0,
-                6.0,
-                7.0,
-                8.0,
-                9.0,
-                10.0,
-                12.0,
-                14.0,
-                16.0,
-                18.0,
-                20.0,
-                21.0,
-                24.0,
-                26.0,
-                27.0,
-                30.0,
-            ],
-            "temperature": [
-                -3.0,
-                -4.0,
-                -0.92,
-                -0.90,
-                -0.56,
-                -0.50,
-                -0.46,
-                -0.42,
-                -0.48,
-                -0.53,
-                -0.74,
-                -0.85,
-                -0.76,
-                -0.74,
-                -0.81,
-                -0.82,
-                -0.87,
-                -0.94,
-                -1.01,
-                -1.01,
-                -1.05,
-                -1.06,
-                -1.09,
-                -1.28,
-                -1.29,
-                -1.28,
-            ],
+            "depth": reference_depths.tolist(),
+            "temperature": reference_temps.tolist(),
         }
 
-        # Создаем интерполяционную функцию на основе реальных данных
-        self.interp_function = interpolate.interp1d(
-            self.reference_profile["depth"],
-            self.reference_profile["temperature"],
-            kind="linear",
-            fill_value="extrapolate",
+        # Те же точки эталона в виде массивов для векторных расчётов
+        self.reference_depths = np.asarray(self.reference_profile["depth"], dtype=float)
+        self.reference_temps = np.asarray(
+            self.reference_profile["temperature"], dtype=float
         )
-
-        # ML модель
-        self.ml_model = None
-        self.is_ml_trained = False
-        self.training_data = []
+        self.reference_surface_temp = self.reference_temps[0]
+
+        # Интерполяционная функция на основе реальных данных
+        self.interp_function = self.interpolate_reference
+
+        # Библиотека эталонов с координатами для прогноза по ближайшим
+        # термограммам (по умолчанию читается из data/references при первом
+        # прогнозе с координатами скважины)
+        self._references = references
+
+        # ML модель: версия из реестра, сам лес загружается при первом прогнозе.
+        # Модель общая для сессий приложения: смена версии и загрузка леса
+        # идут под замком, чтобы лес всегда соответствовал model_version
+        self.registry = registry if registry is not None else ModelRegistry()
+        self._ml_lock = threading.Lock()
+        self._ml_model = None
+        self.model_version = None
+        # Число замеров, на которых обучена текущая модель (None - неизвестно)
+        self.trained_samples = None
+
+        # Замеры для обучения хранятся в SQLite и общие для всех сессий.
+        # База по умолчанию открывается (и создаётся) при первом обращении:
+        # прогнозы без обучения не оставляют data/measurements.db
+        self._store = store
 
         self.load_ml_model()
 
+    @property
+    def ml_model(self):
+        ml_model = self._ml_model
+        if ml_model is not None:
+            return ml_model
+
+        with self._ml_lock:
+            if self._ml_model is None and self.model_version is not None:
+                try:
+                    self._ml_model = self.registry.load(self.model_version)
+                except Exception:
+                    # Файл версии удалён или повреждён - модель считаем не обученной
+                    self.model_version = None
+                    self.trained_samples = None
+            return self._ml_model
+
+    @ml_model.setter
+    def ml_model(self, ml_model):
+        self._ml_model = ml_model
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = MeasurementStore()
+        return self._store
+
+    @property
+    def references(self):
+        """Библиотека эталонных термограмм (None - каталога нет)"""
+        if self._references is None and os.path.isdir(REFERENCES_DIR):
+            try:
+                self._references = ReferenceLibrary.load(REFERENCES_DIR)
+            except (OSError, ValueError, KeyError):
+                # Повреждённый каталог - остаёмся на встроенном эталоне
+                self._references = False
+        return self._references or None
+
+    @property
+    def is_ml_trained(self):
+        return self._ml_model is not None or self.model_version is not None
+
+    @timed("model.predict_temperature")
     def predict_temperature(
         self, depth, lithology, surface_temp, season="лето", use_ml=True
     ):
         """
         Модель на основе реальных данных с корректировкой по поверхности
         """
+        return float(
+            self.predict_profile([depth], [lithology], surface_temp, season, use_ml)[0]
+        )
+
+    @timed("model.predict_profile")
+    def predict_profile(
+        self,
+        depths,
+        lithologies,
+        surface_temp,
+        season="лето",
+        use_ml=False,
+        location=None,
+    ):
+        """
+        Температурный профиль сразу для массива глубин (один проход NumPy).
+        С use_ml и обученной моделью - один пакетный прогноз ML модели.
+        location - координаты скважины (x, y): эталоном служат ближайшие
+        термограммы библиотеки, без координат - встроенный эталон K36T
+        """
+        if use_ml and self.is_ml_trained:
+            return self.ml_predict_profile(depths, lithologies, surface_temp, season)
+
+        depths = np.asarray(depths, dtype=float)
+        count("model.reference_points", len(depths))
+
         # Базовое предсказание из эталонного профиля
-        base_temp = float(self.interp_function(depth))
+        base_temps, reference_surface_temp = self.reference_for_location(
+            depths, location
+        )
 
         # Корректируем относительно температуры поверхности
         # В эталонном профиле поверхность = -3°C, корректируем под нашу поверхность
-        surface_diff = surface_temp - (-3.0)  # Разница с эталонной поверхностью
-        corrected_temp = base_temp + surface_diff * self.get_surface_influence(depth)
+        surface_diff = surface_temp - reference_surface_temp
+        corrected = base_temps + surface_diff * self.get_surface_influence_profile(
+            depths
+        )
 
-        return round(corrected_temp, 2)
+        return np.round(corrected, 2)
+
+    def reference_for_location(self, depths, location=None):
+        """
+        Эталонные температуры на глубинах и температура поверхности эталона:
+        взвешенные ближайшие термограммы библиотеки для скважины с
+        координатами, иначе встроенный эталон
+        """
+        neighbours = self.reference_neighbours(None if location is None else [location])
+        if neighbours is None:
+            return self.interpolate_reference(depths), self.reference_surface_temp
+
+        temps, surface_temps = self.references.weighted_profiles([location], depths)
+        return temps[0], surface_temps[0]
+
+    def reference_names(self, location=None):
+        """Имена термограмм, по которым строится профиль скважины"""
+        neighbours = self.reference_neighbours(None if location is None else [location])
+        if neighbours is None:
+            return [BUILTIN_REFERENCE]
+        _, reference_ids, weights = neighbours
+        return [self.references.names[i] for i in reference_ids[0][weights[0] > 0]]
+
+    def reference_neighbours(self, locations):
+        """
+        Ближайшие термограммы библиотеки для скважин (locations - n x 2,
+        NaN - скважина без координат): маска скважин с координатами, индексы
+        эталонов и веса для них (как из ReferenceLibrary.nearest). None -
+        библиотека не нужна ни одной скважине
+        """
+        if locations is None:
+            return None
+        locations = np.atleast_2d(np.asarray(locations, dtype=float))
+        located = np.isfinite(locations).all(axis=1)
+        if not located.any():
+            return None
+
+        references = self.references
+        if references is None or not references.has_locations:
+            return None
+        reference_ids, weights = references.nearest(locations[located])
+        return located, reference_ids, weights
+
+    def reference_at(self, depths, neighbours=None, owners=None):
+        """
+        Эталонные температуры в точках и температура поверхности эталона
+        каждой точки. owners - номер скважины точки в neighbours (из
+        reference_neighbours): для скважин с координатами эталон - ближайшие
+        термограммы библиотеки, для остальных - встроенный эталон
+        """
+        depths = np.asarray(depths, dtype=float)
+        temps = self.interpolate_reference(depths)
+        surface_temps = np.full(depths.shape, self.reference_surface_temp)
+        if neighbours is None:
+            return temps, surface_temps
+
+        located, reference_ids, weights = neighbours
+        points = located[owners]
+        # Строка скважины точки среди скважин с координатами
+        rows = (np.cumsum(located) - 1)[owners[points]]
+        temps[points], surface_temps[points] = self.references.weighted_temps(
+            reference_ids[rows], weights[rows], depths[points]
+        )
+        return temps, surface_temps
+
+    def interpolate_reference(self, depths):
+        """
+        Линейная интерполяция эталонного профиля с экстраполяцией за его пределы
+        """
+        depths = np.asarray(depths, dtype=float)
+        x = self.reference_depths
+        y = self.reference_temps
+        temps = np.interp(depths, x, y)
+
+        # np.interp обрезает значения по краям, продолжаем крайние отрезки
+        first_slope = (y[1] - y[0]) / (x[1] - x[0])
+        last_slope = (y[-1] - y[-2]) / (x[-1] - x[-2])
+        temps = np.where(depths < x[0], y[0] + first_slope * (depths - x[0]), temps)
+        temps = np.where(depths > x[-1], y[-1] + last_slope * (depths - x[-1]), temps)
+
+        return temps
 
     def get_surface_influence(self, depth):
         """
@@ -120,150 +350,568 @@ class PermafrostModel:
         else:
             return max(0.1, 1.0 - depth / 10.0)  # Минимум 10% влияния
 
-    def normalize_lithology(self, lithology_name):
+    def get_surface_influence_profile(self, depths):
         """
-        Нормализуем названия грунтов к стандартным
+        То же затухание, что и get_surface_influence, для массива глубин
         """
-        if not isinstance(lithology_name, str):
-            return "суглинок"
-
-        lith_lower = lithology_name.lower().strip()
-
-        lithology_map = {
-            "торф": "торф",
-            "суглинок": "суглинок",
-            "супесь": "супесь",
-            "песок": "песок",
-            "прс": "прс",
-            "прп": "торф",
-            "растительный": "прс",
-            "мох": "прс",
-            "моховой": "прс",
-            "растительный слой": "прс",
-            "почва": "прс",
-        }
+        depths = np.asarray(depths, dtype=float)
+        return np.where(
+            depths <= 1.0,
+            1.0,
+            np.where(
+                depths <= 5.0,
+                1.0 - (depths - 1.0) / 4.0,
+                np.maximum(0.1, 1.0 - depths / 10.0),
+            ),
+        )
+
+    def threshold_depths(
+        self, surface_temps, threshold=0.0, max_depth=30.0, location=None
+    ):
+        """
+        Точная глубина, с которой температура профиля не выше threshold,
+        для массива температур поверхности. 0 - порог достигнут уже на
+        поверхности, NaN - не достигнут до max_depth. location - координаты
+        скважины, эталон выбирается как в predict_profile
+        """
+        neighbours = self.reference_neighbours(None if location is None else [location])
+        edges = self.profile_breakpoints(max_depth, neighbours is not None)
+        thresholds = np.full(len(edges) - 1, threshold, dtype=float)
+        return self._first_depth_at_or_below(
+            surface_temps, edges, thresholds, neighbours
+        )
 
-        for key, value in lithology_map.items():
-            if key in lith_lower:
-                return value
+    def state_depths(
+        self,
+        surface_temps,
+        layer_depths_to,
+        layer_codes,
+        state="твёрдомёрзлый",
+        location=None,
+    ):
+        """
+        Глубина, с которой грунт переходит в состояние state (или холоднее)
+        с учётом порогов по грунту каждого слоя. layer_depths_to и
+        layer_codes - подошвы слоёв (по возрастанию) и коды их грунтов,
+        location - координаты скважины (эталон как в predict_profile)
+        """
+        surface_temps = np.asarray(surface_temps, dtype=float)
+        layer_depths_to = np.asarray(layer_depths_to, dtype=float)
+        depths = self._layered_state_depths(
+            surface_temps,
+            layer_depths_to,
+            layer_codes,
+            np.zeros(len(layer_depths_to), dtype=np.intp),
+            1,
+            state,
+            None if location is None else [location],
+        )[0]
+        return depths[0] if surface_temps.ndim == 0 else depths
+
+    def borehole_state_depths(
+        self, borehole_index, boreholes, surface_temps, state="твёрдомёрзлый"
+    ):
+        """
+        state_depths для списка скважин BoreholeIndex (с координатами из
+        журнала): отрезки всех скважин порции из STATE_DEPTHS_CHUNK скважин
+        считаются одним проходом NumPy. Массив (число скважин x число
+        температур поверхности)
+        """
+        surface_temps = np.atleast_1d(np.asarray(surface_temps, dtype=float))
+        positions = np.array(
+            [borehole_index.positions[borehole] for borehole in boreholes],
+            dtype=np.intp,
+        )
+        result = np.empty((len(positions), len(surface_temps)))
+        for first in range(0, len(positions), STATE_DEPTHS_CHUNK):
+            chunk = positions[first : first + STATE_DEPTHS_CHUNK]
+            starts = borehole_index.starts[chunk]
+            counts = borehole_index.stops[chunk] - starts
+
+            # Строки слоёв скважин порции подряд и номер скважины каждой строки
+            owners = np.repeat(np.arange(len(chunk)), counts)
+            rows = np.arange(counts.sum()) + np.repeat(
+                starts - (np.cumsum(counts) - counts), counts
+            )
+            result[first : first + len(chunk)] = self._layered_state_depths(
+                surface_temps,
+                borehole_index.depth_to[rows],
+                borehole_index.lithology_codes[rows],
+                owners,
+                len(chunk),
+                state,
+                borehole_index.locations[chunk],
+            )
+        return result
+
+    def _layered_state_depths(
+        self,
+        surface_temps,
+        layer_depths_to,
+        layer_codes,
+        owners,
+        n_boreholes,
+        state,
+        locations=None,
+    ):
+        """
+        Глубины перехода в состояние state для n_boreholes скважин. Слои
+        всех скважин подряд: owners - номер скважины слоя, внутри скважины
+        слои по возрастанию глубины. locations - координаты скважин
+        (n_boreholes x 2) для выбора эталона
+        """
+        surface_temps = np.atleast_1d(np.asarray(surface_temps, dtype=float))
+        layer_codes = np.asarray(layer_codes, dtype=np.intp)
+        result = np.full((n_boreholes, len(surface_temps)), np.nan)
+        neighbours = self.reference_neighbours(locations)
+
+        # Глубина скважины - подошва её последнего слоя
+        max_depths = np.full(n_boreholes, np.nan)
+        last = np.append(owners[1:] != owners[:-1], True)[: len(owners)]
+        max_depths[owners[last]] = layer_depths_to[last]
+
+        # Границы отрезков каждой скважины: поверхность, изломы профиля
+        # (своего эталона), подошвы слоёв и забой
+        boreholes = np.arange(n_boreholes)
+        located = np.zeros(n_boreholes, dtype=bool)
+        if neighbours is not None:
+            located = neighbours[0]
+        break_owners = []
+        break_depths = []
+        for group, from_library in ((~located, False), (located, True)):
+            if group.any():
+                breaks = self.profile_breakpoints(np.inf, from_library)[1:-1]
+                break_owners.append(np.repeat(boreholes[group], len(breaks)))
+                break_depths.append(np.tile(breaks, int(group.sum())))
+        edge_owners = np.concatenate(break_owners + [owners, boreholes, boreholes])
+        edge_depths = np.concatenate(
+            break_depths + [layer_depths_to, np.zeros(n_boreholes), max_depths]
+        )
+        keep = (edge_depths >= 0) & (edge_depths <= max_depths[edge_owners])
+        order = np.lexsort((edge_depths[keep], edge_owners[keep]))
+        edge_owners = edge_owners[keep][order]
+        edge_depths = edge_depths[keep][order]
+
+        # Отрезок - соседние различные границы одной скважины
+        segments = (edge_owners[1:] == edge_owners[:-1]) & (
+            edge_depths[1:] > edge_depths[:-1]
+        )
+        top = edge_depths[:-1][segments]
+        bottom = edge_depths[1:][segments]
+        segment_owners = edge_owners[:-1][segments]
+        if not len(top):
+            return result
+
+        # Слой отрезка - первый слой скважины, подошва которого не выше
+        # середины отрезка (поиск сразу по всем скважинам: ключ смещён на
+        # номер скважины)
+        span = np.nanmax(np.abs(layer_depths_to)) + 1.0
+        layers = np.searchsorted(
+            owners * span + layer_depths_to,
+            segment_owners * span + (top + bottom) / 2,
+        )
+        thresholds = STATE_THRESHOLDS[state][layer_codes[layers]]
 
-        if "пес" in lith_lower:
-            return "песок"
-        elif "сугл" in lith_lower:
-            return "суглинок"
-        elif "супе" in lith_lower:
-            return "супесь"
-        elif "торф" in lith_lower:
-            return "торф"
+        # Первая глубина перехода - минимум по отрезкам своей скважины
+        candidates = self._crossing_depths(
+            surface_temps, top, bottom, thresholds, neighbours, segment_owners
+        )
+        firsts = np.flatnonzero(
+            np.append(True, segment_owners[1:] != segment_owners[:-1])
+        )
+        depths = np.minimum.reduceat(candidates, firsts, axis=1)
+        depths[np.isinf(depths)] = np.nan
+        result[segment_owners[firsts]] = depths.T
+        return result
+
+    def profile_breakpoints(self, max_depth, located=False):
+        """
+        Глубины изломов профиля: точки эталона и изломы затухания влияния
+        поверхности. Между соседними изломами профиль линеен по глубине.
+        located=True - эталон из библиотеки: изломы в узлах её сетки
+        """
+        reference_depths = (
+            self.references.grid_depths if located else self.reference_depths
+        )
+        edges = np.union1d(reference_depths, SURFACE_INFLUENCE_BREAKS)
+        edges = edges[(edges > 0) & (edges < max_depth)]
+        return np.concatenate([[0.0], edges, [max_depth]])
 
-        return "суглинок"
+    def _first_depth_at_or_below(
+        self, surface_temps, edges, thresholds, neighbours=None
+    ):
+        surface_temps = np.asarray(surface_temps, dtype=float)
+        candidates = self._crossing_depths(
+            np.atleast_1d(surface_temps),
+            edges[:-1],
+            edges[1:],
+            thresholds,
+            neighbours,
+            np.zeros(len(edges) - 1, dtype=np.intp),
+        )
+        depths = candidates.min(axis=1)
+        depths[np.isinf(depths)] = np.nan
+        return depths[0] if surface_temps.ndim == 0 else depths
+
+    def _crossing_depths(
+        self, surface_temps, top, bottom, thresholds, neighbours=None, owners=None
+    ):
+        """
+        Глубина, с которой профиль не выше порога, на каждом отрезке
+        [top, bottom]: массив (температуры поверхности x отрезки), inf -
+        на отрезке порог не достигнут. neighbours и owners - эталоны
+        скважин и номер скважины отрезка (см. reference_at)
+        """
+        # Внутри отрезка профиль линеен: берём две внутренние точки и
+        # продолжаем прямую до концов (на границе 5 м влияние поверхности
+        # меняется скачком, поэтому сами границы не вычисляем)
+        width = bottom - top
+        z1, z2 = top + 0.25 * width, top + 0.75 * width
+        reference1, reference_surface_temps = self.reference_at(z1, neighbours, owners)
+        reference2, _ = self.reference_at(z2, neighbours, owners)
+
+        surface_diff = surface_temps[:, None] - reference_surface_temps
+        t1 = reference1 + surface_diff * self.get_surface_influence_profile(z1)
+        t2 = reference2 + surface_diff * self.get_surface_influence_profile(z2)
+        above_top = 1.5 * t1 - 0.5 * t2 - thresholds
+        above_bottom = 1.5 * t2 - 0.5 * t1 - thresholds
+
+        # Отрезок уже начинается не выше порога - глубина его кровли,
+        # иначе точка пересечения прямой с порогом внутри отрезка
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inside = top + above_top / (above_top - above_bottom) * width
+        return np.where(
+            above_top <= CROSSING_TOLERANCE,
+            top,
+            np.where(above_bottom <= CROSSING_TOLERANCE, inside, np.inf),
+        )
+
+    def normalize_lithology(self, lithology_name):
+        """
+        Нормализуем названия грунтов к стандартным
+        """
+        return normalize_lithology(lithology_name)
 
     # Остальные методы оставляем как были
     def ml_prediction(self, depth, lithology, surface_temp, season):
-        if not self.is_ml_trained:
-            return self.predict_temperature(depth, lithology, surface_temp, season)
-
-        season_encoded = {"зима": 0, "весна": 1, "лето": 2, "осень": 3}
-        lithology_encoded = {
-            "торф": 0,
-            "суглинок": 1,
-            "супесь": 2,
-            "песок": 3,
-            "прс": 4,
-        }
+        return float(
+            self.ml_predict_profile([depth], [lithology], surface_temp, season)[0]
+        )
 
-        lithology_norm = self.normalize_lithology(lithology)
+    @timed("model.ml_predict_profile")
+    def ml_predict_profile(self, depths, lithologies, surface_temp, season):
+        """
+        Прогноз ML модели для массива глубин одним вызовом predict.
+        lithologies - названия грунтов или уже готовые коды
+        """
+        ml_model = self.ml_model
+        if ml_model is None:
+            return self.predict_profile(depths, lithologies, surface_temp, season)
+
+        depths = np.asarray(depths, dtype=float)
+        return self._ml_predict_points(
+            ml_model,
+            depths,
+            np.broadcast_to(self.encode_lithologies(lithologies), depths.shape),
+            np.full(len(depths), surface_temp, dtype=float),
+            np.full(len(depths), SEASON_CODES[season], dtype=np.intp),
+        )
 
-        features = np.array(
-            [
-                [
-                    depth,
-                    lithology_encoded.get(lithology_norm, 1),
-                    surface_temp,
-                    season_encoded[season],
-                ]
-            ]
+    @timed("model.predict_points")
+    def predict_points(
+        self, depths, lithologies, surface_temps, seasons, use_ml=False, locations=None
+    ):
+        """
+        Прогноз для независимых точек: у каждой своя глубина, грунт,
+        температура поверхности и сезон (названия или коды; скаляр - общий
+        для всех точек). Все точки считаются одним проходом NumPy или одним
+        вызовом predict ML модели. locations - координаты скважины каждой
+        точки (n x 2, NaN - без координат): эталон как в predict_profile
+        (ML модель от координат не зависит)
+        """
+        depths = np.asarray(depths, dtype=float)
+        lithology_codes = np.broadcast_to(
+            self.encode_lithologies(lithologies), depths.shape
         )
+        surface_temps = np.broadcast_to(
+            np.asarray(surface_temps, dtype=float), depths.shape
+        )
+        season_codes = np.broadcast_to(self.encode_seasons(seasons), depths.shape)
 
-        prediction = self.ml_model.predict(features)[0]
-        return round(prediction, 2)
-
-    def add_training_data(self, depth, lithology, surface_temp, season, actual_temp):
-        season_encoded = {"зима": 0, "весна": 1, "лето": 2, "осень": 3}
-        lithology_encoded = {
-            "торф": 0,
-            "суглинок": 1,
-            "супесь": 2,
-            "песок": 3,
-            "прс": 4,
-        }
+        ml_model = self.ml_model if use_ml else None
+        if ml_model is not None:
+            return self._ml_predict_points(
+                ml_model, depths, lithology_codes, surface_temps, season_codes
+            )
 
+        count("model.reference_points", len(depths))
+        reference_temps, reference_surface_temps = self.reference_at(
+            depths, self.reference_neighbours(locations), np.arange(len(depths))
+        )
+        surface_diff = surface_temps - reference_surface_temps
+        temps = reference_temps + surface_diff * self.get_surface_influence_profile(
+            depths
+        )
+        return np.round(temps, 2)
+
+    def _ml_predict_points(
+        self, ml_model, depths, lithology_codes, surface_temps, season_codes
+    ):
+        # ml_model читается вызывающим один раз: версия может смениться
+        # из другой сессии посреди прогноза
+        count("model.forest_points", len(depths))
+        features = np.column_stack(
+            [depths, lithology_codes, surface_temps, season_codes]
+        ).astype(float)
+
+        # Параллельный обход деревьев окупается только на больших пакетах.
+        # Лес общий для всех сессий и потоков, поэтому число потоков
+        # задаём только на время вызова, не меняя параметры леса
+        if len(depths) >= ML_PARALLEL_MIN_ROWS:
+            from joblib import parallel_config
+
+            with parallel_config(n_jobs=ML_PREDICT_JOBS):
+                predictions = ml_model.predict(features)
+        else:
+            predictions = ml_model.predict(features)
+
+        return np.round(predictions, 2)
+
+    def encode_seasons(self, seasons):
+        """Коды сезонов из названий (или уже готовых кодов)"""
+        season_codes = np.asarray(seasons)
+        if season_codes.dtype.kind in "iu":
+            check_codes(season_codes, len(SEASON_CODES), "сезонов")
+            return season_codes.astype(np.intp)
+        if season_codes.ndim == 0:
+            return np.intp(SEASON_CODES[str(season_codes)])
+        return np.array(
+            [SEASON_CODES[season] for season in season_codes.tolist()], dtype=np.intp
+        )
+
+    def add_training_data(
+        self, depth, lithology, surface_temp, season, actual_temp, borehole=None
+    ):
         lithology_norm = self.normalize_lithology(lithology)
 
-        self.training_data.append(
-            {
-                "depth": depth,
-                "lithology": lithology_encoded.get(lithology_norm, 1),
-                "surface_temp": surface_temp,
-                "season": season_encoded[season],
-                "actual_temp": actual_temp,
-            }
+        self.store.add(
+            depth,
+            LITHOLOGY_CODES.get(lithology_norm, DEFAULT_LITHOLOGY_CODE),
+            surface_temp,
+            SEASON_CODES[season],
+            actual_temp,
+            borehole=borehole,
         )
 
-    def train_ml_model(self):
-        if len(self.training_data) < 5:
-            return False, "Недостаточно данных для обучения. Нужно минимум 5 замеров."
+    def add_training_batch(
+        self, depths, lithologies, surface_temps, seasons, actual_temps, boreholes=None
+    ):
+        """
+        Пакетное добавление замеров (массивы одинаковой длины; грунты и
+        сезоны - названиями или готовыми кодами)
+        """
+        lithology_codes = self.encode_lithologies(lithologies)
+        season_codes = np.broadcast_to(
+            self.encode_seasons(seasons), lithology_codes.shape
+        ).tolist()
+        if boreholes is None:
+            boreholes = [None] * len(lithology_codes)
+
+        rows = zip(
+            boreholes,
+            np.asarray(depths, dtype=float).tolist(),
+            lithology_codes.tolist(),
+            np.asarray(surface_temps, dtype=float).tolist(),
+            season_codes,
+            np.asarray(actual_temps, dtype=float).tolist(),
+        )
+        return self.store.add_many(rows)
+
+    def training_count(self):
+        """Число замеров для обучения"""
+        return self.store.count()
 
-        df = pd.DataFrame(self.training_data)
-        X = df[["depth", "lithology", "surface_temp", "season"]]
-        y = df["actual_temp"]
+    @timed("model.train_ml_model")
+    def train_ml_model(self, incremental=False):
+        """
+        Обучение ML модели на замерах из базы.
+        incremental=True: при малом приросте замеров переобучение пропускается,
+        при умеренном - к лесу добавляются деревья, обученные только на новых
+        замерах, при большом - лес обучается заново
+        """
+        X, y = self.store.load_training_arrays()
+        if len(y) < 5:
+            return False, "Недостаточно данных для обучения. Нужно минимум 5 замеров."
 
-        if self.ml_model is None:
-            self.ml_model = RandomForestRegressor(n_estimators=50, random_state=42)
+        n_new = len(y) - (self.trained_samples or 0)
+        growth = n_new / max(self.trained_samples or 0, 1)
+        can_extend = (
+            incremental
+            and self.trained_samples
+            and self.ml_model is not None
+            and 0 <= n_new
+            and len(self.ml_model.estimators_) < ML_MAX_TREES
+        )
 
-        self.ml_model.fit(X, y)
-        self.is_ml_trained = True
+        if can_extend and growth < INCREMENTAL_MIN_GROWTH:
+            return True, (
+                f"Модель актуальна: новых замеров {n_new} "
+                f"(меньше {INCREMENTAL_MIN_GROWTH:.0%}), переобучение не нужно"
+            )
+
+        if can_extend and growth < FULL_RETRAIN_GROWTH:
+            ml_model = self.extend_forest(X[-n_new:], y[-n_new:], len(y))
+            message = (
+                f"Модель дообучена на {n_new} новых замерах "
+                f"(всего {len(y)}, деревьев {len(ml_model.estimators_)})"
+            )
+        else:
+            from sklearn.ensemble import RandomForestRegressor
+
+            ml_model = RandomForestRegressor(
+                n_estimators=ML_BASE_TREES, random_state=42
+            )
+            ml_model.fit(X, y)
+            message = f"Модель успешно обучена на {len(y)} замерах"
+
+        # Подменяем модель целиком, чтобы параллельные прогнозы
+        # не видели наполовину обученный лес
+        self.ml_model = ml_model
+        self.trained_samples = len(y)
         self.save_ml_model()
 
-        return True, f"Модель успешно обучена на {len(self.training_data)} замерах"
+        return True, message
 
-    def save_ml_model(self):
-        if self.ml_model is not None:
-            os.makedirs("models", exist_ok=True)
-            joblib.dump(self.ml_model, "models/temperature_model.joblib")
+    def extend_forest(self, X_new, y_new, n_total):
+        """
+        Копия текущего леса с дополнительными деревьями, обученными на новых
+        замерах. Число новых деревьев пропорционально доле новых замеров
+        """
+        from sklearn.ensemble import RandomForestRegressor
 
-    def load_ml_model(self):
-        try:
-            self.ml_model = joblib.load("models/temperature_model.joblib")
-            self.is_ml_trained = True
-        except:
-            self.ml_model = None
-            self.is_ml_trained = False
+        n_trees = max(1, round(ML_BASE_TREES * len(y_new) / n_total))
+        extra = RandomForestRegressor(
+            n_estimators=n_trees, random_state=self.trained_samples
+        )
+        extra.fit(X_new, y_new)
 
-    def get_ground_state(self, temp, lithology):
-        temperature_grades = {
-            "песок": {"твёрдомёрзлый": -0.10, "пластичномёрзлый": (-0.11, -0.29)},
-            "супесь": {"твёрдомёрзлый": -0.60, "пластичномёрзлый": (-0.21, -0.59)},
-            "суглинок": {"твёрдомёрзлый": -1.00, "пластичномёрзлый": (-0.26, -0.99)},
-            "торф": {"твёрдомёрзлый": -0.50, "пластичномёрзлый": (-0.21, -0.49)},
-            "прс": {"твёрдомёрзлый": -0.30, "пластичномёрзлый": (-0.11, -0.29)},
+        ml_model = copy.copy(self.ml_model)
+        ml_model.estimators_ = self.ml_model.estimators_ + extra.estimators_
+        ml_model.n_estimators = len(ml_model.estimators_)
+        return ml_model
+
+    @timed("model.save_ml_model")
+    def save_ml_model(self):
+        """Сохраняем модель новой версией в реестре"""
+        if self._ml_model is None:
+            return
+
+        metadata = {
+            "trained_samples": self.trained_samples,
+            "features": FEATURE_COLUMNS,
+            "lithology_types": LITHOLOGY_TYPES,
+            "season_codes": SEASON_CODES,
+            "n_estimators": len(self._ml_model.estimators_),
         }
 
-        lithology_norm = self.normalize_lithology(lithology)
+        previous_version = self.model_version
+        self.model_version = self.registry.save(self._ml_model, metadata)
+        self._release_version(previous_version)
+
+    def load_ml_model(self, version=None):
+        """
+        Выбираем версию модели (по умолчанию последнюю). Читаем только
+        метаданные, сам лес загрузится при первом ML прогнозе
+        """
+        previous_version = self.model_version
+        # Версию и метаданные узнаём заранее, а переключаемся одним шагом:
+        # прогноз из другой сессии не увидит модель без версии
+        version, trained_samples = self._select_version(version)
+        with self._ml_lock:
+            self._ml_model = None
+            self.model_version = version
+            self.trained_samples = trained_samples
+        self._release_version(previous_version)
+
+    def _release_version(self, previous_version):
+        # Прежняя версия больше не нужна - не держим её лес в памяти процесса
+        if previous_version is not None and previous_version != self.model_version:
+            self.registry.release(previous_version)
+
+    def _select_version(self, version):
+        """Версия модели и число её замеров (None, None - модели нет)"""
+        if version is None:
+            version = self.registry.latest_version()
+        if version is None:
+            return None, None
+
+        try:
+            metadata = self.registry.metadata(version)
+        except (OSError, ValueError):
+            return None, None
 
-        if lithology_norm not in temperature_grades:
-            lithology_norm = "суглинок"
+        # Модель с другим набором признаков использовать нельзя
+        if metadata.get("features", FEATURE_COLUMNS) != FEATURE_COLUMNS:
+            return None, None
 
-        grades = temperature_grades[lithology_norm]
+        return version, metadata.get("trained_samples")
 
-        if temp <= grades["твёрдомёрзлый"]:
-            return "твёрдомёрзлый"
-        elif (
-            isinstance(grades["пластичномёрзлый"], tuple)
-            and grades["пластичномёрзлый"][0] <= temp <= grades["пластичномёрзлый"][1]
+    def refresh_ml_model(self):
+        """
+        Переключаемся на более новую версию модели, если её сохранил
+        другой процесс. Возвращает True, если версия сменилась
+        """
+        latest = self.registry.latest_version()
+        if latest is None or (
+            self.model_version is not None and latest <= self.model_version
         ):
-            return "пластичномёрзлый"
-        elif temp < 0:
-            return "охлаждённый"
-        else:
-            return "талый"
+            return False
+
+        self.load_ml_model(latest)
+        return self.model_version == latest
+
+    def get_ground_state(self, temp, lithology):
+        # Одна точка - без массивов NumPy, те же пороги, что в
+        # classify_ground_states
+        code = lithology_code(lithology)
+        if temp <= HARD_FROZEN_TEMPS[code]:
+            return GROUND_STATES[0]
+        if PLASTIC_FROZEN_MIN[code] <= temp <= PLASTIC_FROZEN_MAX[code]:
+            return GROUND_STATES[1]
+        if temp < 0:
+            return GROUND_STATES[2]
+        return GROUND_STATES[3]
+
+    def encode_lithologies(self, lithologies):
+        """
+        Коды грунтов для массива названий (готовые коды возвращаются как есть)
+        """
+        lithology_codes = np.atleast_1d(np.asarray(lithologies))
+        if lithology_codes.dtype.kind in "iu":
+            check_codes(lithology_codes, len(LITHOLOGY_TYPES), "грунтов")
+            return lithology_codes
+        return encode_lithologies(lithology_codes)
+
+    def classify_ground_states(self, temps, lithology_codes):
+        """
+        Коды состояний грунта (индексы GROUND_STATES) для массивов температур
+        и кодов грунтов
+        """
+        temps = np.asarray(temps, dtype=float)
+        codes = np.asarray(lithology_codes, dtype=np.intp)
+        codes = np.where(
+            (codes >= 0) & (codes < len(HARD_FROZEN_TEMPS)),
+            codes,
+            DEFAULT_LITHOLOGY_CODE,
+        )
+
+        hard_frozen = temps <= HARD_FROZEN_TEMPS[codes]
+        plastic_frozen = (PLASTIC_FROZEN_MIN[codes] <= temps) & (
+            temps <= PLASTIC_FROZEN_MAX[codes]
+        )
+
+        return np.select(
+            [hard_frozen, plastic_frozen, temps < 0],
+            [0, 1, 2],
+            default=3,
+        ).astype(np.int8)
@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from utils.timing import timed
+
+MODELS_DIR = "models"
+MODEL_NAME = "temperature_model"
+
+# Сколько последних версий модели хранить на диске
+KEEP_VERSIONS = 5
+
+# Загруженные модели, общие для всех сессий процесса: путь -> модель
+_loaded_models = {}
+_loaded_models_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Версии ML модели в папке models/: для версии N - файл модели
+    <name>_vNNNN.joblib и метаданные <name>_vNNNN.json. Метаданные
+    пишутся последними, поэтому версия видна только после полной записи
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, name=MODEL_NAME):
+        self.models_dir = models_dir
+        self.name = name
+        self._version_re = re.compile(rf"^{re.escape(name)}_v(\d+)\.(joblib|json)$")
+
+    def artifact_path(self, version):
+        return os.path.join(self.models_dir, f"{self.name}_v{version:04d}.joblib")
+
+    def metadata_path(self, version):
+        return os.path.join(self.models_dir, f"{self.name}_v{version:04d}.json")
+
+    def legacy_path(self):
+        """Файл модели без версий из прежних сборок приложения"""
+        return os.path.join(self.models_dir, f"{self.name}.joblib")
+
+    def _scan(self, suffix):
+        if not os.path.isdir(self.models_dir):
+            return []
+        versions = set()
+        for filename in os.listdir(self.models_dir):
+            match = self._version_re.match(filename)
+            if match and match.group(2) in suffix:
+                versions.add(int(match.group(1)))
+        return sorted(versions)
+
+    def versions(self):
+        """Полностью записанные версии по возрастанию"""
+        return self._scan(("json",))
+
+    def latest_version(self):
+        """Последняя версия; 0 - только старый файл без версий; None - модели нет"""
+        versions = self.versions()
+        if versions:
+            return versions[-1]
+        if os.path.exists(self.legacy_path()):
+            return 0
+        return None
+
+    def metadata(self, version):
+        if version == 0:
+            return {"version": 0}
+        with open(self.metadata_path(version), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, model, metadata):
+        """
+        Атомарно сохраняем новую версию модели, возвращаем её номер
+        """
+        import joblib
+
+        os.makedirs(self.models_dir, exist_ok=True)
+        version = self._reserve_version()
+
+        metadata = dict(metadata, version=version, created_at=time.time())
+        self._atomic_write(
+            self.artifact_path(version), lambda path: joblib.dump(model, path)
+        )
+        self._atomic_write(
+            self.metadata_path(version),
+            lambda path: self._write_json(path, metadata),
+        )
+
+        with _loaded_models_lock:
+            _loaded_models[self.artifact_path(version)] = model
+
+        self._prune()
+        return version
+
+    def load(self, version):
+        """
+        Модель версии version. Файл читается один раз на процесс, и все
+        сессии процесса получают один объект из _loaded_models. Между
+        процессами лес не разделяется: sklearn при загрузке копирует
+        массивы узлов деревьев в свою память, поэтому mmap не помогает
+        """
+        path = self.legacy_path() if version == 0 else self.artifact_path(version)
+        with _loaded_models_lock:
+            if path in _loaded_models:
+                return _loaded_models[path]
+
+        import joblib
+
+        with timed("registry.joblib_load"):
+            model = joblib.load(path)
+
+        with _loaded_models_lock:
+            return _loaded_models.setdefault(path, model)
+
+    def release(self, version):
+        """
+        Убираем версию из общего кэша загруженных моделей (например, после
+        перехода на новую версию). Объекты, которые уже держат модель,
+        продолжают ей пользоваться
+        """
+        path = self.legacy_path() if version == 0 else self.artifact_path(version)
+        with _loaded_models_lock:
+            _loaded_models.pop(path, None)
+
+    def _reserve_version(self):
+        # Номер занимаем созданием пустого файла модели (O_EXCL), чтобы два
+        # процесса, обучающих модель одновременно, не записали одну версию
+        version = max(self._scan(("joblib", "json")), default=0) + 1
+        while True:
+            try:
+                fd = os.open(
+                    self.artifact_path(version), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                )
+                os.close(fd)
+                return version
+            except FileExistsError:
+                version += 1
+
+    def _atomic_write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.models_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write_json(self, path, data):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def _prune(self):
+        for version in self.versions()[:-KEEP_VERSIONS]:
+            for path in (self.metadata_path(version), self.artifact_path(version)):
+                if os.path.exists(path):
+                    os.remove(path)
+                with _loaded_models_lock:
+                    _loaded_models.pop(path, None)
@@ -0,0 +1,265 @@
+"""
+Библиотека эталонных термограмм.
+
+Термограммы лежат в data/references: каталог catalog.csv (имя, файл,
+координаты, дата, грунт) и по CSV файлу "depth,temperature" на скважину.
+Все профили заранее пересчитываются на общую равномерную сетку глубин,
+поэтому интерполяция любого числа эталонов - индексная арифметика NumPy.
+Ближайшие эталоны к скважине ищутся по KD-дереву координат (плоские
+координаты участка в метрах).
+"""
+
+import csv
+import os
+
+import numpy as np
+
+# Папка эталонов поставляется вместе с кодом, поэтому путь - от модуля,
+# а не от текущей папки
+REFERENCES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "references"
+)
+CATALOG_FILE = "catalog.csv"
+
+# Встроенный эталон: используется для скважин без координат
+BUILTIN_REFERENCE = "K36T"
+BUILTIN_REFERENCE_FILE = os.path.join(REFERENCES_DIR, f"{BUILTIN_REFERENCE}.csv")
+
+# Общая сетка глубин эталонов, м
+REFERENCE_GRID_STEP = 0.1
+REFERENCE_MAX_DEPTH = 30.0
+
+# Взвешивание эталонов по расстоянию: число соседей и степень (IDW)
+NEAREST_REFERENCES = 3
+DISTANCE_POWER = 2.0
+
+
+class ReferenceLibrary:
+    """
+    Набор эталонных термограмм с метаданными. Профиль эталона i -
+    строка grid_temps[i] на глубинах grid_depths, глубже сетки профиль
+    продолжается последним отрезком исходной термограммы
+    """
+
+    def __init__(
+        self,
+        names,
+        profiles,
+        coordinates=None,
+        dates=None,
+        lithologies=None,
+        grid_step=REFERENCE_GRID_STEP,
+        max_depth=REFERENCE_MAX_DEPTH,
+    ):
+        count = len(names)
+        self.names = list(names)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        # Координаты (x, y), NaN - эталон без привязки
+        self.coordinates = (
+            np.full((count, 2), np.nan)
+            if coordinates is None
+            else np.asarray(coordinates, dtype=float).reshape(count, 2)
+        )
+        self.dates = list(dates) if dates is not None else [None] * count
+        self.lithologies = (
+            list(lithologies) if lithologies is not None else [None] * count
+        )
+
+        self.grid_step = grid_step
+        self.grid_depths = np.arange(0.0, max_depth + grid_step / 2, grid_step)
+        self.grid_temps = np.empty((count, len(self.grid_depths)))
+        self.last_slopes = np.empty(count)
+        for i, (depths, temps) in enumerate(profiles):
+            depths = np.asarray(depths, dtype=float)
+            temps = np.asarray(temps, dtype=float)
+            first_slope = (temps[1] - temps[0]) / (depths[1] - depths[0])
+            last_slope = (temps[-1] - temps[-2]) / (depths[-1] - depths[-2])
+
+            grid = np.interp(self.grid_depths, depths, temps)
+            above = self.grid_depths < depths[0]
+            below = self.grid_depths > depths[-1]
+            grid[above] = temps[0] + first_slope * (self.grid_depths[above] - depths[0])
+            grid[below] = temps[-1] + last_slope * (
+                self.grid_depths[below] - depths[-1]
+            )
+
+            self.grid_temps[i] = grid
+            if depths[-1] > self.grid_depths[-1]:
+                # Термограмма глубже сетки - наклон её отрезка у края сетки
+                tail = np.interp(self.grid_depths[-1] + grid_step, depths, temps)
+                last_slope = (tail - grid[-1]) / grid_step
+            self.last_slopes[i] = last_slope
+
+        # Температура поверхности эталона (глубина 0)
+        self.surface_temps = self.grid_temps[:, 0].copy()
+
+        self._tree = None
+        self._located = np.flatnonzero(np.isfinite(self.coordinates).all(axis=1))
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, directory=REFERENCES_DIR, **kwargs):
+        """Библиотека из каталога термограмм"""
+        with open(
+            os.path.join(directory, CATALOG_FILE), encoding="utf-8", newline=""
+        ) as f:
+            rows = list(csv.DictReader(f))
+
+        names = []
+        profiles = []
+        coordinates = []
+        dates = []
+        lithologies = []
+        for row in rows:
+            names.append(row["name"])
+            profiles.append(load_profile(os.path.join(directory, row["file"])))
+            coordinates.append(
+                [_float_or_nan(row.get("x")), _float_or_nan(row.get("y"))]
+            )
+            dates.append(row.get("date") or None)
+            lithologies.append(row.get("lithology") or None)
+
+        return cls(
+            names,
+            profiles,
+            np.array(coordinates, dtype=float).reshape(len(names), 2),
+            dates,
+            lithologies,
+            **kwargs,
+        )
+
+    @property
+    def has_locations(self):
+        """Есть ли эталоны с координатами"""
+        return len(self._located) > 0
+
+    def metadata(self, name):
+        i = self.positions[name]
+        x, y = self.coordinates[i]
+        return {
+            "name": name,
+            "x": None if np.isnan(x) else float(x),
+            "y": None if np.isnan(y) else float(y),
+            "date": self.dates[i],
+            "lithology": self.lithologies[i],
+        }
+
+    def interpolate(self, reference_ids, depths):
+        """
+        Температуры эталонов на глубинах: строка на эталон (reference_ids -
+        массив индексов, depths - общие для всех глубины)
+        """
+        reference_ids = np.asarray(reference_ids, dtype=np.intp)
+        return self.interpolate_points(reference_ids[..., None], depths)
+
+    def interpolate_points(self, reference_ids, depths):
+        """
+        Температура эталона reference_ids[i] на глубине depths[i] (массивы
+        индексов и глубин согласованной формы)
+        """
+        reference_ids = np.asarray(reference_ids, dtype=np.intp)
+        depths = np.asarray(depths, dtype=float)
+
+        position = np.clip(depths / self.grid_step, 0, len(self.grid_depths) - 1)
+        left = np.minimum(position.astype(np.intp), len(self.grid_depths) - 2)
+        weight = position - left
+
+        rows = self.grid_temps[reference_ids, left]
+        temps = rows + weight * (self.grid_temps[reference_ids, left + 1] - rows)
+
+        # Выше поверхности и глубже сетки - продолжаем крайние отрезки
+        above = depths < 0
+        if above.any():
+            first_slope = (
+                self.grid_temps[reference_ids, 1] - self.grid_temps[reference_ids, 0]
+            ) / self.grid_step
+            temps = np.where(
+                above, self.surface_temps[reference_ids] + first_slope * depths, temps
+            )
+        below = depths > self.grid_depths[-1]
+        if below.any():
+            temps = np.where(
+                below,
+                self.grid_temps[reference_ids, -1]
+                + self.last_slopes[reference_ids] * (depths - self.grid_depths[-1]),
+                temps,
+            )
+        return temps
+
+    def nearest(self, points, k=NEAREST_REFERENCES, power=DISTANCE_POWER):
+        """
+        Ближайшие эталоны для точек (n x 2): индексы эталонов (n x k) и веса
+        обратно пропорциональные расстоянию в степени power (сумма весов 1).
+        Точка, совпавшая с эталоном, получает только его
+        """
+        if not self.has_locations:
+            raise ValueError("В библиотеке нет эталонов с координатами")
+
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        k = max(1, min(k, len(self._located)))
+        distances, neighbours = self.tree.query(points, k=k)
+        distances = distances.reshape(len(points), k)
+        neighbours = neighbours.reshape(len(points), k)
+
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / distances**power
+        exact = distances == 0
+        weights = np.where(exact.any(axis=1, keepdims=True), exact, weights)
+        weights = weights / weights.sum(axis=1, keepdims=True)
+
+        return self._located[neighbours], weights
+
+    @property
+    def tree(self):
+        """KD-дерево координат эталонов (строится при первом поиске)"""
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+
+            self._tree = cKDTree(self.coordinates[self._located])
+        return self._tree
+
+    def weighted_profiles(
+        self, points, depths, k=NEAREST_REFERENCES, power=DISTANCE_POWER
+    ):
+        """
+        Взвешенные эталонные профили для точек (n x 2): температуры
+        (n x глубины) и температуры поверхности эталонов (n)
+        """
+        reference_ids, weights = self.nearest(points, k, power)
+        used, inverse = np.unique(reference_ids, return_inverse=True)
+        temps = self.interpolate(used, depths)[inverse.reshape(reference_ids.shape)]
+
+        profiles = np.einsum("nk,nkd->nd", weights, temps)
+        surface_temps = (weights * self.surface_temps[reference_ids]).sum(axis=1)
+        return profiles, surface_temps
+
+    def weighted_temps(self, reference_ids, weights, depths):
+        """
+        Взвешенные температуры эталонов в точках: у точки i свои соседи
+        reference_ids[i] с весами weights[i] (n x k, как из nearest) и своя
+        глубина depths[i]. Возвращает температуры и температуры поверхности
+        эталонов (n)
+        """
+        temps = self.interpolate_points(
+            reference_ids, np.asarray(depths, dtype=float)[:, None]
+        )
+        return (
+            (weights * temps).sum(axis=1),
+            (weights * self.surface_temps[reference_ids]).sum(axis=1),
+        )
+
+
+def load_profile(path):
+    """Термограмма из CSV "depth,temperature": массивы глубин и температур"""
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    data = data[np.argsort(data[:, 0])]
+    return data[:, 0], data[:, 1]
+
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
@@ -0,0 +1,512 @@
+"""
+Локальный HTTP сервис пакетных прогнозов температуры.
+
+Запуск из корня проекта:
+    python -m service [--host 127.0.0.1] [--port 8765] [--window-ms 5]
+
+Модель загружается один раз и остаётся в памяти. Одновременные запросы
+собираются в общий пакет и считаются одним векторным прогнозом
+(PermafrostModel.predict_points).
+
+POST /predict - точки: {"depths": [...], "lithologies": [...],
+    "surface_temps": [...] или "surface_temp": -1, "seasons": [...] или
+    "season": "лето", "use_ml": false}
+POST /profiles - скважины журнала: {"journal": "путь к .xlsx/.csv",
+    "boreholes": [...] (по умолчанию все), "depths": [...] (по умолчанию
+    стандартные), "surface_temp": -1, "season": "лето", "use_ml": false}
+GET /metrics - число запросов и точек, пропускная способность, задержки
+GET /health - версия модели
+
+Тело запроса и ответа - JSON (колонки списками) или Arrow IPC stream
+(Content-Type / Accept: application/vnd.apache.arrow.stream).
+"""
+
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from excel_parser import BoreholeDataParser
+from model import GROUND_STATES, STANDARD_DEPTHS, PermafrostModel
+from utils.lithology import LITHOLOGY_TYPES
+from utils.timing import timed
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Сколько ждать другие запросы для общего пакета и предельный размер пакета
+COALESCE_WINDOW_MS = 5.0
+MAX_BATCH_POINTS = 200000
+
+# Как часто проверять, не обучена ли в реестре новая версия модели, с
+MODEL_REFRESH_INTERVAL = 30.0
+
+# Сколько последних запросов учитывать в задержках
+LATENCY_WINDOW = 1000
+
+# Предельный размер тела запроса, байт
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class ServiceMetrics:
+    """Счётчики сервиса и задержки последних LATENCY_WINDOW запросов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.points = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def request_done(self, seconds, points=0, error=False):
+        with self._lock:
+            self.requests += 1
+            self.points += points
+            self.errors += int(error)
+            self._latencies.append(seconds)
+
+    def batch_done(self, requests):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += requests
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            uptime = time.time() - self.started_at
+            data = {
+                "uptime_s": round(uptime, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "points": self.points,
+                "batches": self.batches,
+                "requests_per_batch": round(
+                    self.batched_requests / self.batches if self.batches else 0.0, 2
+                ),
+                "points_per_s": round(self.points / uptime if uptime else 0.0, 1),
+            }
+
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            data["latency_ms"] = {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(latencies.max()), 3),
+            }
+        return data
+
+
+class _PendingRequest:
+    def __init__(
+        self, depths, lithology_codes, surface_temps, season_codes, use_ml, locations
+    ):
+        self.depths = depths
+        self.lithology_codes = lithology_codes
+        self.surface_temps = surface_temps
+        self.season_codes = season_codes
+        self.use_ml = use_ml
+        self.locations = locations
+        self.future = Future()
+
+
+class PredictionBatcher:
+    """
+    Очередь прогнозов: запросы, пришедшие в пределах window_ms, считаются
+    одним вызовом predict_points (отдельно для ML и эталонного профиля)
+    """
+
+    def __init__(
+        self,
+        model,
+        metrics=None,
+        window_ms=COALESCE_WINDOW_MS,
+        max_batch_points=MAX_BATCH_POINTS,
+    ):
+        self.model = model
+        self.metrics = metrics if metrics is not None else ServiceMetrics()
+        self.window = window_ms / 1000
+        self.max_batch_points = max_batch_points
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._last_refresh = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._loop, name="permafrost-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self, depths, lithologies, surface_temps, seasons, use_ml=False, locations=None
+    ):
+        """
+        Ставим точки в очередь, возвращаем Future с массивом температур.
+        Названия грунтов и сезонов кодируются здесь, в потоке запроса.
+        locations - координаты скважины каждой точки (n x 2, NaN - без них)
+        """
+        depths = np.asarray(depths, dtype=float).ravel()
+        if locations is None:
+            locations = np.nan
+        request = _PendingRequest(
+            depths,
+            np.broadcast_to(self.model.encode_lithologies(lithologies), depths.shape),
+            np.broadcast_to(np.asarray(surface_temps, dtype=float), depths.shape),
+            np.broadcast_to(self.model.encode_seasons(seasons), depths.shape),
+            bool(use_ml),
+            np.broadcast_to(np.asarray(locations, dtype=float), depths.shape + (2,)),
+        )
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Сервис остановлен")
+            self._pending.append(request)
+            self._condition.notify()
+        return request.future
+
+    def predict(
+        self, depths, lithologies, surface_temps, seasons, use_ml=False, locations=None
+    ):
+        return self.submit(
+            depths, lithologies, surface_temps, seasons, use_ml, locations
+        ).result()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped and not self._pending:
+                    return
+
+            # Ждём остальные запросы окна (или пока пакет не наберётся)
+            deadline = time.monotonic() + self.window
+            with self._condition:
+                while (
+                    not self._stopped
+                    and sum(len(r.depths) for r in self._pending)
+                    < self.max_batch_points
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._pending = self._pending, []
+
+            self._refresh_model()
+            for use_ml in (False, True):
+                requests = [r for r in batch if r.use_ml == use_ml]
+                if requests:
+                    self._run_batch(requests, use_ml)
+
+    def _refresh_model(self):
+        # Модель обновляется только здесь, между пакетами
+        if time.monotonic() - self._last_refresh >= MODEL_REFRESH_INTERVAL:
+            self._last_refresh = time.monotonic()
+            try:
+                self.model.refresh_ml_model()
+            except Exception:
+                pass
+
+    @timed("service.batch")
+    def _run_batch(self, requests, use_ml):
+        try:
+            temps = self.model.predict_points(
+                np.concatenate([r.depths for r in requests]),
+                np.concatenate([r.lithology_codes for r in requests]),
+                np.concatenate([r.surface_temps for r in requests]),
+                np.concatenate([r.season_codes for r in requests]),
+                use_ml=use_ml,
+                locations=np.concatenate([r.locations for r in requests]),
+            )
+        except Exception as e:
+            if len(requests) == 1:
+                requests[0].future.set_exception(e)
+                return
+            # Ошибка одного запроса не должна ронять весь пакет: считаем
+            # запросы по отдельности, исключение получит только виновный
+            for request in requests:
+                self._run_batch([request], use_ml)
+            return
+
+        self.metrics.batch_done(len(requests))
+        offset = 0
+        for request in requests:
+            size = len(request.depths)
+            request.future.set_result(temps[offset : offset + size])
+            offset += size
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
+class PredictionService:
+    """Модель, батчер и разобранные журналы, общие для всех запросов"""
+
+    def __init__(self, model=None, window_ms=COALESCE_WINDOW_MS):
+        self.model = model if model is not None else PermafrostModel()
+        # Прогреваем: лес загружается до первого запроса
+        if self.model.is_ml_trained:
+            self.model.ml_model
+        self.metrics = ServiceMetrics()
+        self.batcher = PredictionBatcher(self.model, self.metrics, window_ms)
+        self.parser = BoreholeDataParser()
+        self._journals_lock = threading.Lock()
+
+    def predict(self, request):
+        """Прогноз для точек запроса: колонки ответа"""
+        depths = np.asarray(request["depths"], dtype=float)
+        lithologies = request["lithologies"]
+        surface_temps = request.get("surface_temps", request.get("surface_temp"))
+        seasons = request.get("seasons", request.get("season", "лето"))
+        if surface_temps is None:
+            raise ValueError("Нужна температура поверхности: surface_temps")
+
+        temps = self.batcher.predict(
+            depths, lithologies, surface_temps, seasons, request.get("use_ml", False)
+        )
+        lithology_codes = np.broadcast_to(
+            self.model.encode_lithologies(lithologies), depths.shape
+        )
+        states = self.model.classify_ground_states(temps, lithology_codes)
+        return {
+            "depth": depths.tolist(),
+            "lithology": np.array(LITHOLOGY_TYPES)[lithology_codes].tolist(),
+            "temperature": temps.tolist(),
+            "state": np.array(GROUND_STATES)[states].tolist(),
+        }
+
+    def profiles(self, request):
+        """Профили скважин журнала: все скважины запроса одним пакетом"""
+        index = self.journal_index(request["journal"])
+        # Колонки Arrow запроса - массивы NumPy: пустоту проверяем по длине
+        boreholes = request.get("boreholes")
+        if boreholes is None or len(boreholes) == 0:
+            boreholes = index.boreholes
+        standard_depths = request.get("depths")
+        if standard_depths is None or len(standard_depths) == 0:
+            standard_depths = STANDARD_DEPTHS
+        standard_depths = np.asarray(standard_depths, dtype=float)
+
+        labels = []
+        depths = []
+        codes = []
+        locations = []
+        for borehole in boreholes:
+            if borehole not in index.positions:
+                raise ValueError(f"Скважины {borehole} нет в журнале")
+            borehole_depths = standard_depths[
+                standard_depths <= index.max_depth(borehole)
+            ]
+            labels.extend([str(borehole)] * len(borehole_depths))
+            depths.append(borehole_depths)
+            codes.append(index.lithology_codes_at(borehole, borehole_depths))
+            locations.append(
+                np.tile(
+                    index.locations[index.positions[borehole]],
+                    (len(borehole_depths), 1),
+                )
+            )
+
+        depths = np.concatenate(depths) if depths else np.empty(0)
+        codes = np.concatenate(codes).astype(np.intp) if codes else np.empty(0, int)
+        locations = np.concatenate(locations) if locations else np.empty((0, 2))
+        temps = self.batcher.predict(
+            depths,
+            codes,
+            request.get("surface_temp", -1.0),
+            request.get("season", "лето"),
+            request.get("use_ml", False),
+            locations,
+        )
+        states = self.model.classify_ground_states(temps, codes)
+        return {
+            "borehole": labels,
+            "depth": depths.tolist(),
+            "lithology": np.array(LITHOLOGY_TYPES)[codes].tolist(),
+            "temperature": temps.tolist(),
+            "state": np.array(GROUND_STATES)[states].tolist(),
+        }
+
+    def journal_index(self, path):
+        """Индекс журнала: разбирается один раз (кэш парсера по хэшу файла)"""
+        with self._journals_lock:
+            if str(path).lower().endswith(".csv"):
+                df = self.parser.parse_streaming(path)
+            else:
+                df = self.parser.parse_excel_data(path)
+            return self.parser.get_index(df)
+
+    def health(self):
+        return {"status": "ok", "model_version": self.model.model_version}
+
+    def shutdown(self):
+        self.batcher.shutdown()
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.service.metrics.snapshot())
+        elif self.path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": f"Неизвестный адрес {self.path}"})
+
+    def do_POST(self):
+        handlers = {
+            "/predict": self.service.predict,
+            "/profiles": self.service.profiles,
+        }
+        if self.path not in handlers:
+            self._send_json(404, {"error": f"Неизвестный адрес {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            result = handlers[self.path](self._read_request())
+        except KeyError as e:
+            # Нет обязательного поля или неизвестный сезон
+            self.service.metrics.request_done(time.perf_counter() - start, error=True)
+            self._send_json(400, {"error": f"Нет поля или неизвестное значение: {e}"})
+            return
+        except (ValueError, TypeError) as e:
+            self.service.metrics.request_done(time.perf_counter() - start, error=True)
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.service.metrics.request_done(time.perf_counter() - start, error=True)
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self._send_result(result)
+        self.service.metrics.request_done(
+            time.perf_counter() - start, points=len(result["temperature"])
+        )
+
+    def _read_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Тело запроса больше {MAX_BODY_BYTES} байт")
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type", "").startswith(ARROW_MIME):
+            return read_arrow_request(body)
+        return json.loads(body or b"{}")
+
+    def _send_result(self, result):
+        if ARROW_MIME in self.headers.get("Accept", ""):
+            self._send(200, ARROW_MIME, write_arrow_table(result))
+        else:
+            self._send_json(200, result)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send(status, f"{JSON_MIME}; charset=utf-8", body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Журнал запросов в stderr замедляет сервис под нагрузкой
+        pass
+
+
+# Колонки Arrow запроса -> ключи JSON запроса
+ARROW_COLUMNS = {
+    "depth": "depths",
+    "lithology": "lithologies",
+    "surface_temp": "surface_temps",
+    "season": "seasons",
+}
+
+
+def read_arrow_request(body):
+    """
+    Запрос из Arrow IPC stream: колонки depth, lithology, surface_temp,
+    season; остальные параметры - в метаданных схемы (JSON значения)
+    """
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(body).read_all()
+    request = {
+        key: table.column(column).to_numpy(zero_copy_only=False)
+        for column, key in ARROW_COLUMNS.items()
+        if column in table.column_names
+    }
+    for key, value in (table.schema.metadata or {}).items():
+        request[key.decode()] = json.loads(value)
+    return request
+
+
+def write_arrow_table(columns):
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None):
+    """HTTP сервер (каждый запрос в своём потоке) вокруг PredictionService"""
+    service = service if service is not None else PredictionService()
+    handler = type(
+        "BoundPredictionRequestHandler",
+        (PredictionRequestHandler,),
+        {"service": service},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP сервис прогнозов температуры")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        default=COALESCE_WINDOW_MS,
+        help="Окно объединения одновременных запросов, мс",
+    )
+    args = parser.parse_args(argv)
+
+    server = make_server(
+        args.host, args.port, PredictionService(window_ms=args.window_ms)
+    )
+    print(f"Сервис прогнозов: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
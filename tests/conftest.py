@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# Модули приложения лежат в корне проекта
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def make_model(tmp_path_factory):
+    """
+    Фабрика PermafrostModel с базой замеров и реестром моделей в отдельной
+    временной папке (рабочие data/ тесты не трогают)
+    """
+    from database import MeasurementStore
+    from model import PermafrostModel
+    from models.registry import ModelRegistry
+
+    def make(**kwargs):
+        path = tmp_path_factory.mktemp("model")
+        return PermafrostModel(
+            store=MeasurementStore(str(path / "measurements.db")),
+            registry=ModelRegistry(str(path)),
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture
+def model(make_model):
+    return make_model()
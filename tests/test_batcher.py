@@ -0,0 +1,52 @@
+"""
+Проверка запросов PredictionBatcher: неизвестные коды отклоняются в потоке
+запроса, ошибка одного запроса не роняет остальные запросы пакета
+"""
+
+import numpy as np
+import pytest
+
+from service import PredictionBatcher
+from utils.lithology import LITHOLOGY_TYPES
+
+
+@pytest.fixture
+def batcher(model):
+    batcher = PredictionBatcher(model, window_ms=200)
+    yield batcher
+    batcher.shutdown()
+
+
+@pytest.mark.parametrize(
+    "lithologies, seasons",
+    [
+        ([len(LITHOLOGY_TYPES)], "лето"),
+        ([-1], "лето"),
+        ([1], [7]),
+        ([1], [-1]),
+    ],
+)
+def test_unknown_codes_rejected_on_submit(batcher, lithologies, seasons):
+    with pytest.raises(ValueError):
+        batcher.submit([1.0], lithologies, -1.0, seasons)
+
+
+def test_failed_request_does_not_fail_batch(model, batcher, monkeypatch):
+    predict_points = model.predict_points
+
+    def failing_predict_points(depths, *args, **kwargs):
+        if np.isnan(depths).any():
+            raise ValueError("глубина NaN")
+        return predict_points(depths, *args, **kwargs)
+
+    monkeypatch.setattr(model, "predict_points", failing_predict_points)
+
+    good = batcher.submit([1.0, 5.0], "песок", -1.0, "лето")
+    bad = batcher.submit([np.nan], "песок", -1.0, "лето")
+    other = batcher.submit([2.0], [1], -2.0, [0])
+
+    expected = model.predict_profile([1.0, 5.0], "песок", -1.0)
+    np.testing.assert_allclose(good.result(timeout=5), expected)
+    assert len(other.result(timeout=5)) == 1
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
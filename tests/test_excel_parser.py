@@ -0,0 +1,70 @@
+"""
+Потоковый разбор журнала (parse_streaming) даёт те же глубины и грунты,
+что и обычный (parse_excel_data); ошибки разбора - ValueError
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_journal
+from excel_parser import BoreholeDataParser, BoreholeIndex, FirstBorehole
+
+
+def test_streaming_matches_eager(tmp_path):
+    path = str(tmp_path / "journal.xlsx")
+    generate_journal(30, seed=2).to_excel(path, index=False)
+    parser = BoreholeDataParser()
+    eager = BoreholeIndex(parser.parse_excel_data(path))
+    streamed = BoreholeIndex(parser.parse_streaming(path))
+
+    assert streamed.boreholes == eager.boreholes
+    np.testing.assert_array_equal(streamed.depth_to, eager.depth_to)
+    for borehole in eager.boreholes:
+        # Глубины на подошвах слоёв - самые чувствительные к точности
+        depths = eager.depth_to[eager.block(borehole)]
+        np.testing.assert_array_equal(
+            streamed.lithology_codes_at(borehole, depths),
+            eager.lithology_codes_at(borehole, depths),
+        )
+
+
+def test_missing_columns_raise(tmp_path):
+    path = str(tmp_path / "journal.csv")
+    generate_journal(2).drop(columns=["Описание"]).to_csv(path, index=False)
+    xlsx_path = str(tmp_path / "journal.xlsx")
+    generate_journal(2).drop(columns=["Описание"]).to_excel(xlsx_path, index=False)
+    parser = BoreholeDataParser()
+
+    with pytest.raises(ValueError, match="Описание"):
+        parser.parse_streaming(path)
+    with pytest.raises(ValueError, match="Описание"):
+        parser.parse_excel_data(xlsx_path)
+
+
+def test_unreadable_file_raises(tmp_path):
+    path = tmp_path / "journal.xlsx"
+    path.write_bytes(b"not an xlsx file")
+    with pytest.raises(ValueError, match="Ошибка чтения файла"):
+        BoreholeDataParser().parse_excel_data(str(path))
+
+
+def test_first_borehole_ready_before_end(tmp_path):
+    journal = generate_journal(40, seed=3)
+    path = str(tmp_path / "journal.csv")
+    journal.to_csv(path, index=False)
+    parser = BoreholeDataParser()
+
+    first = FirstBorehole()
+    rows_read = 0
+    for chunk in parser.iter_journal_chunks(path, chunk_size=50):
+        rows_read += len(chunk)
+        if first.add(chunk):
+            break
+    assert first.layers is not None
+    assert rows_read < len(journal)
+
+    borehole = journal["Скважина"].iloc[0]
+    assert first.borehole == borehole
+    assert first.layers == parser.get_layers_for_borehole(
+        parser.parse_streaming(path), borehole
+    )
@@ -0,0 +1,51 @@
+"""
+Неявная схема HeatConductionSimulator: стационарный мёрзлый разрез остаётся
+на геотермическом профиле, блоки скважин в общей системе не связаны
+"""
+
+import numpy as np
+import pytest
+
+from heat import HeatConductionSimulator
+
+STACKS = [
+    # (подошвы слоёв, коды грунтов)
+    (np.array([2.0, 7.5, 30.0]), np.array([0, 1, 3])),
+    (np.array([30.0]), np.array([2])),
+    (np.array([0.4, 3.0, 12.0, 30.0]), np.array([4, 2, 1, 3])),
+]
+
+# Температуры сохраняются в float32
+TOLERANCE = 1e-5
+
+
+def test_frozen_steady_state_stays_on_geothermal_profile():
+    simulator = HeatConductionSimulator()
+    mean_temps = np.array([-5.0, -4.0, -6.5])
+    result = simulator.simulate(STACKS, mean_temps, amplitudes=0.0, years=2)
+
+    expected = simulator.initial_profile(simulator.node_codes(STACKS), mean_temps)
+    # Весь разрез мёрзлый - фазового перехода нет
+    assert result.temperatures.max() < -1.0
+    np.testing.assert_allclose(
+        result.temperatures,
+        np.broadcast_to(expected, result.temperatures.shape),
+        atol=TOLERANCE,
+    )
+
+
+@pytest.mark.parametrize("amplitude", [0.0, 15.0])
+def test_boreholes_solved_together_match_alone(amplitude):
+    simulator = HeatConductionSimulator()
+    mean_temps = np.array([-2.0, -0.5, -3.0])
+    together = simulator.simulate(
+        STACKS, mean_temps, amplitudes=amplitude, years=1, output_every_days=10
+    )
+
+    for i, stack in enumerate(STACKS):
+        alone = simulator.simulate(
+            [stack], mean_temps[i], amplitudes=amplitude, years=1, output_every_days=10
+        )
+        np.testing.assert_allclose(
+            together.temperatures[:, i], alone.temperatures[:, 0], atol=TOLERANCE
+        )
@@ -0,0 +1,79 @@
+"""
+Потоковый импорт логгеров (LoggerImporter): повторы строк отбрасываются и
+между порциями файла, каждый период датчика даёт один замер
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_journal
+from excel_parser import BoreholeIndex
+from importer import LoggerImporter
+
+SENSOR_DEPTHS = [1.0, 3.0, 5.0]
+DAYS = 10
+
+
+def logger_rows(boreholes, borehole_major=False):
+    """Показание каждого датчика раз в сутки: по времени или скважина за скважиной"""
+    rows = [
+        {
+            "borehole": borehole,
+            "depth": depth,
+            "timestamp": pd.Timestamp("2024-01-01") + pd.Timedelta(days=day),
+            "temperature": -1.0 - 0.1 * day - depth / 10,
+        }
+        for day in range(DAYS)
+        for borehole in boreholes
+        for depth in SENSOR_DEPTHS
+    ]
+    if borehole_major:
+        rows.sort(key=lambda row: list(boreholes).index(row["borehole"]))
+    return rows
+
+
+def import_samples(model, index, rows, chunk_size):
+    """Замеры и статистика импорта; проверяем, что каждый период датчика - один замер"""
+    importer = LoggerImporter(model, index, chunk_size=chunk_size)
+    csv = io.StringIO(pd.DataFrame(rows).to_csv(index=False))
+    stats = {}
+    samples = pd.concat(list(importer.iter_samples(csv, stats)))
+
+    assert len(samples) == len(index.boreholes) * len(SENSOR_DEPTHS) * DAYS
+    assert not samples.duplicated(["borehole", "depth", "bucket"]).any()
+    np.testing.assert_allclose(
+        samples["temperature"],
+        -1.0
+        - 0.1 * (samples["bucket"] - pd.Timestamp("2024-01-01")).dt.days
+        - samples["depth"] / 10,
+    )
+    return stats
+
+
+@pytest.mark.parametrize("chunk_size", [4, 7, 100000])
+def test_repeated_rows_across_chunks(model, chunk_size):
+    index = BoreholeIndex(generate_journal(2, seed=1))
+    rows = logger_rows(index.boreholes)
+
+    # Повторы последних суток: их периоды ещё открыты при любом размере порции
+    stats = import_samples(model, index, rows + rows[-3:], chunk_size)
+    assert stats["duplicate_rows"] == 3
+    assert stats["late_rows"] == 0
+
+    # Повторы первых суток: после записи периода повтор неотличим от
+    # опоздавшей строки
+    stats = import_samples(model, index, rows + rows[:3], chunk_size)
+    assert stats["duplicate_rows"] + stats["late_rows"] == 3
+
+
+@pytest.mark.parametrize("chunk_size", [5, 7, 100000])
+def test_borehole_major_order(model, chunk_size):
+    index = BoreholeIndex(generate_journal(3, seed=1))
+    rows = logger_rows(index.boreholes, borehole_major=True)
+
+    stats = import_samples(model, index, rows, chunk_size)
+    assert stats["duplicate_rows"] == 0
+    assert stats["late_rows"] == 0
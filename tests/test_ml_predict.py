@@ -0,0 +1,83 @@
+"""
+Прогноз обученной ML модели: грунт можно передать одним названием или
+кодом на все глубины, как и для эталонного профиля
+"""
+
+import numpy as np
+import pytest
+
+from model import STANDARD_DEPTHS
+from utils.lithology import LITHOLOGY_TYPES
+
+DEPTHS = [1.0, 2.0, 3.0]
+
+
+@pytest.fixture
+def trained_model(model):
+    rng = np.random.default_rng(0)
+    n = 200
+    depths = rng.choice(STANDARD_DEPTHS, n).astype(float)
+    surface_temps = rng.uniform(-5.0, 2.0, n)
+    model.add_training_batch(
+        depths,
+        rng.integers(0, len(LITHOLOGY_TYPES), n),
+        surface_temps,
+        rng.integers(0, 4, n),
+        surface_temps * np.exp(-depths / 5),
+    )
+    success, message = model.train_ml_model()
+    assert success, message
+    return model
+
+
+@pytest.mark.parametrize("lithology", ["песок", 3])
+def test_scalar_lithology(trained_model, lithology):
+    scalar = trained_model.predict_profile(DEPTHS, lithology, -1.0, use_ml=True)
+    per_depth = trained_model.predict_profile(
+        DEPTHS, [lithology] * len(DEPTHS), -1.0, use_ml=True
+    )
+    assert scalar.shape == (len(DEPTHS),)
+    np.testing.assert_array_equal(scalar, per_depth)
+
+
+def test_version_switch_during_predictions(trained_model):
+    import threading
+
+    model = trained_model
+    first = model.model_version
+    model.train_ml_model()
+    second = model.model_version
+    assert second != first
+
+    expected = []
+    for version in (first, second):
+        model.load_ml_model(version)
+        expected.append(model.predict_profile(DEPTHS, "песок", -1.0, use_ml=True))
+
+    errors = []
+    results = []
+    stop = threading.Event()
+
+    def predict():
+        try:
+            while not stop.is_set():
+                results.append(
+                    model.predict_profile(DEPTHS, "песок", -1.0, use_ml=True)
+                )
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=predict) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(200):
+        model.load_ml_model(first if i % 2 else second)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    # Каждый прогноз - от одной из версий, не эталонный профиль
+    assert all(
+        any(np.array_equal(result, temps) for temps in expected) for result in results
+    )
@@ -0,0 +1,17 @@
+"""
+База замеров по умолчанию открывается только при первом обращении:
+прогнозы не создают data/measurements.db в рабочей папке
+"""
+
+from model import PermafrostModel
+
+
+def test_prediction_does_not_create_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = PermafrostModel()
+    model.predict_profile([1.0, 2.0], "песок", -1.0)
+    model.predict_points([1.0, 2.0], [1, 3], -1.0, "лето")
+    assert not (tmp_path / "data").exists()
+
+    assert model.training_count() == 0
+    assert (tmp_path / "data" / "measurements.db").exists()
@@ -0,0 +1,56 @@
+"""
+Профили скважин (PredictionService.profiles) из JSON и Arrow запросов
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_journal
+from service import PredictionService, read_arrow_request, write_arrow_table
+
+
+@pytest.fixture
+def service(model):
+    service = PredictionService(model)
+    yield service
+    service.shutdown()
+
+
+@pytest.fixture
+def journal(tmp_path):
+    path = str(tmp_path / "journal.xlsx")
+    generate_journal(3, seed=4).to_excel(path, index=False)
+    return path
+
+
+def arrow_request(columns, **params):
+    """Тело Arrow запроса: колонки и параметры в метаданных схемы"""
+    import pyarrow as pa
+
+    table = pa.table(columns).replace_schema_metadata(
+        {key: json.dumps(value) for key, value in params.items()}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_profiles_arrow_depths(service, journal):
+    depths = [0.5, 1.0, 2.0]
+    request = read_arrow_request(arrow_request({"depth": depths}, journal=journal))
+    response = service.profiles(request)
+
+    expected = service.profiles({"journal": journal, "depths": depths})
+    assert response == expected
+    assert set(response["depth"]) <= set(depths)
+    # Ответ тоже можно отдать Arrow таблицей
+    assert write_arrow_table(response)
+
+
+def test_profiles_default_depths(service, journal):
+    response = service.profiles({"journal": journal, "depths": [], "boreholes": []})
+    assert len(set(response["borehole"])) == 3
+    assert np.isin(response["depth"], [0.0, 0.5, 1.0, 30.0]).any()
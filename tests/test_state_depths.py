@@ -0,0 +1,181 @@
+"""
+Точные глубины перехода через пороги состояний (PermafrostModel.state_depths,
+threshold_depths, borehole_state_depths) против плотного перебора глубин
+с шагом 0.1 мм
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_journal
+from excel_parser import BoreholeIndex
+from model import STATE_THRESHOLDS
+
+DENSE_STEP = 1e-4
+# Перебор находит первую точку сетки за переходом: расхождение не больше шага
+TOLERANCE = 2 * DENSE_STEP
+
+SURFACE_TEMPS = np.linspace(-10.0, 5.0, 16)
+
+LAYERS = [
+    # (подошвы слоёв, коды грунтов)
+    ([0.3, 1.2, 4.0, 9.5, 18.0, 30.0], [4, 0, 1, 2, 3, 1]),
+    ([2.5, 5.0, 7.3, 12.0], [1, 3, 2, 0]),
+    ([0.8, 21.7], [0, 3]),
+]
+
+
+def dense_profile(model, surface_temp, max_depth):
+    depths = np.arange(0.0, max_depth + DENSE_STEP / 2, DENSE_STEP)
+    temps = model.interpolate_reference(depths) + (
+        surface_temp - model.reference_surface_temp
+    ) * model.get_surface_influence_profile(depths)
+    return depths, temps
+
+
+def first_depth(depths, below):
+    return depths[np.argmax(below)] if below.any() else np.nan
+
+
+def dense_state_depth(model, surface_temp, layer_depths_to, layer_codes, state):
+    depths, temps = dense_profile(model, surface_temp, layer_depths_to[-1])
+    layers = np.minimum(
+        np.searchsorted(layer_depths_to, depths), len(layer_depths_to) - 1
+    )
+    thresholds = STATE_THRESHOLDS[state][layer_codes[layers]]
+    return first_depth(depths, temps <= thresholds)
+
+
+def assert_close(solved, dense):
+    if np.isnan(dense):
+        assert np.isnan(solved)
+    else:
+        assert solved == pytest.approx(dense, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("threshold", [0.0, -0.5, -1.0])
+def test_threshold_depths_match_dense_sampling(model, threshold):
+    solved = model.threshold_depths(SURFACE_TEMPS, threshold)
+    for surface_temp, depth in zip(SURFACE_TEMPS, solved):
+        depths, temps = dense_profile(model, surface_temp, 30.0)
+        assert_close(depth, first_depth(depths, temps <= threshold))
+
+
+@pytest.mark.parametrize("state", list(STATE_THRESHOLDS))
+@pytest.mark.parametrize("layer_depths_to, layer_codes", LAYERS)
+def test_state_depths_match_dense_sampling(model, state, layer_depths_to, layer_codes):
+    layer_depths_to = np.asarray(layer_depths_to)
+    layer_codes = np.asarray(layer_codes)
+
+    solved = model.state_depths(SURFACE_TEMPS, layer_depths_to, layer_codes, state)
+    for surface_temp, depth in zip(SURFACE_TEMPS, solved):
+        assert_close(
+            depth,
+            dense_state_depth(model, surface_temp, layer_depths_to, layer_codes, state),
+        )
+
+
+def test_state_depths_scalar_surface_temp(model):
+    depth = model.state_depths(-1.0, [2.0, 5.5, 30.0], [0, 1, 3])
+    assert np.ndim(depth) == 0
+
+
+@pytest.mark.parametrize("state", list(STATE_THRESHOLDS))
+def test_borehole_state_depths_match_dense_sampling(model, state):
+    index = BoreholeIndex(generate_journal(10, seed=3))
+    solved = model.borehole_state_depths(index, index.boreholes, SURFACE_TEMPS, state)
+
+    assert solved.shape == (len(index.boreholes), len(SURFACE_TEMPS))
+    for borehole, borehole_depths in zip(index.boreholes, solved):
+        rows = index.block(borehole)
+        layer_depths_to = index.depth_to[rows]
+        layer_codes = index.lithology_codes[rows]
+        for surface_temp, depth in zip(SURFACE_TEMPS, borehole_depths):
+            assert_close(
+                depth,
+                dense_state_depth(
+                    model, surface_temp, layer_depths_to, layer_codes, state
+                ),
+            )
+
+
+@pytest.fixture(scope="module")
+def located_model(make_model):
+    from references import ReferenceLibrary
+
+    depths = np.array([0.0, 1.0, 3.0, 7.5, 15.0, 32.0])
+    library = ReferenceLibrary(
+        ["A", "B", "C"],
+        [
+            (depths, [-2.0, -3.5, -0.8, -0.4, -0.9, -1.3]),
+            (depths, [-5.0, -4.0, -1.5, -1.1, -1.4, -1.6]),
+            (depths, [1.0, 0.5, 0.1, -0.2, -0.3, -0.5]),
+        ],
+        [[0.0, 0.0], [100.0, 0.0], [0.0, 100.0]],
+    )
+    return make_model(references=library)
+
+
+@pytest.mark.parametrize("location", [(20.0, 30.0), (100.0, 0.0), (60.0, 70.0)])
+@pytest.mark.parametrize("state", list(STATE_THRESHOLDS))
+def test_located_state_depths_match_dense_sampling(located_model, location, state):
+    layer_depths_to, layer_codes = map(np.asarray, LAYERS[0])
+    solved = located_model.state_depths(
+        SURFACE_TEMPS, layer_depths_to, layer_codes, state, location
+    )
+
+    depths = np.arange(0.0, layer_depths_to[-1] + DENSE_STEP / 2, DENSE_STEP)
+    reference, reference_surface_temp = located_model.reference_for_location(
+        depths, location
+    )
+    influence = located_model.get_surface_influence_profile(depths)
+    layers = np.minimum(
+        np.searchsorted(layer_depths_to, depths), len(layer_depths_to) - 1
+    )
+    thresholds = STATE_THRESHOLDS[state][layer_codes[layers]]
+    for surface_temp, depth in zip(SURFACE_TEMPS, solved):
+        temps = reference + (surface_temp - reference_surface_temp) * influence
+        assert_close(depth, first_depth(depths, temps <= thresholds))
+
+
+def test_located_boreholes_use_their_reference(located_model):
+    journal = generate_journal(6, seed=5)
+    boreholes = journal["Скважина"].unique()
+    coordinates = {
+        borehole: (15.0 * i, 40.0 - 5.0 * i) for i, borehole in enumerate(boreholes)
+    }
+    # Последняя скважина - без координат (встроенный эталон)
+    coordinates[boreholes[-1]] = (np.nan, np.nan)
+    journal["X, м"] = journal["Скважина"].map(lambda b: coordinates[b][0])
+    journal["Y, м"] = journal["Скважина"].map(lambda b: coordinates[b][1])
+    index = BoreholeIndex(journal)
+
+    solved = located_model.borehole_state_depths(
+        index, index.boreholes, SURFACE_TEMPS, "охлаждённый"
+    )
+    for borehole, depths in zip(index.boreholes, solved):
+        rows = index.block(borehole)
+        expected = located_model.state_depths(
+            SURFACE_TEMPS,
+            index.depth_to[rows],
+            index.lithology_codes[rows],
+            "охлаждённый",
+            index.location(borehole),
+        )
+        np.testing.assert_allclose(depths, expected, equal_nan=True)
+
+        # Точечный прогноз совпадает с профилем скважины
+        location = index.location(borehole)
+        profile_depths = np.linspace(0.0, index.max_depth(borehole), 13)
+        codes = index.lithology_codes_at(borehole, profile_depths)
+        locations = np.full((len(profile_depths), 2), np.nan)
+        if location is not None:
+            locations[:] = location
+        np.testing.assert_allclose(
+            located_model.predict_points(
+                profile_depths, codes, -1.0, "лето", locations=locations
+            ),
+            located_model.predict_profile(
+                profile_depths, codes, -1.0, location=location
+            ),
+        )
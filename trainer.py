@@ -0,0 +1,91 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Состояния задачи обучения
+JOB_PENDING = "в очереди"
+JOB_RUNNING = "обучение"
+JOB_DONE = "готово"
+JOB_FAILED = "ошибка"
+
+
+class TrainingJob:
+    """Задача фонового обучения, которую приложение опрашивает по статусу"""
+
+    def __init__(self, job_id, incremental):
+        self.job_id = job_id
+        self.incremental = incremental
+        self.state = JOB_PENDING
+        self.success = None
+        self.message = ""
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def is_active(self):
+        return self.state in (JOB_PENDING, JOB_RUNNING)
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class BackgroundTrainer:
+    """
+    Обучение PermafrostModel в фоновом потоке: интерфейс не блокируется,
+    задачи выполняются по одной в порядке поступления
+    """
+
+    def __init__(self, model, on_trained=None):
+        self.model = model
+        # Вызывается после успешного обучения (например, чтобы сбросить кэши)
+        self.on_trained = on_trained
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="permafrost-trainer"
+        )
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.last_job = None
+
+    def submit(self, incremental=True):
+        """
+        Ставим обучение в очередь. Если обучение уже идёт, возвращаем
+        текущую задачу вместо новой
+        """
+        with self._lock:
+            if self.last_job is not None and self.last_job.is_active:
+                return self.last_job
+
+            job = TrainingJob(next(self._ids), incremental)
+            self.last_job = job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def status(self):
+        """Последняя задача обучения (None, если обучения не было)"""
+        return self.last_job
+
+    def _run(self, job):
+        job.state = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.success, job.message = self.model.train_ml_model(
+                incremental=job.incremental
+            )
+            job.state = JOB_DONE if job.success else JOB_FAILED
+            if job.success and self.on_trained is not None:
+                self.on_trained()
+        except Exception as e:
+            job.success = False
+            job.message = f"Ошибка обучения: {e}"
+            job.state = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,97 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Стандартные типы грунтов, код грунта - индекс в списке
+# (совпадает с кодировкой признаков ML модели, порядок менять нельзя)
+LITHOLOGY_TYPES = ["торф", "суглинок", "супесь", "песок", "прс"]
+LITHOLOGY_CODES = {name: code for code, name in enumerate(LITHOLOGY_TYPES)}
+
+DEFAULT_LITHOLOGY = "суглинок"
+DEFAULT_LITHOLOGY_CODE = LITHOLOGY_CODES[DEFAULT_LITHOLOGY]
+
+# Ключевые слова в названии грунта (проверяются по порядку)
+LITHOLOGY_KEYWORDS = (
+    ("торф", "торф"),
+    ("суглинок", "суглинок"),
+    ("супесь", "супесь"),
+    ("песок", "песок"),
+    ("прс", "прс"),
+    ("прп", "торф"),
+    ("растительный", "прс"),
+    ("мох", "прс"),
+    ("моховой", "прс"),
+    ("растительный слой", "прс"),
+    ("почва", "прс"),
+)
+
+# Если ключевых слов нет, пытаемся определить по началу слова
+LITHOLOGY_STEMS = (
+    ("пес", "песок"),
+    ("сугл", "суглинок"),
+    ("супе", "супесь"),
+    ("торф", "торф"),
+)
+
+# В журналах повторяются несколько десятков описаний, кэша хватает с запасом
+NORMALIZE_CACHE_SIZE = 4096
+
+# С какого размера массива названий кодировать через pd.factorize
+# (на малых массивах быстрее словарь поверх кэша нормализации)
+FACTORIZE_MIN_SIZE = 1024
+
+
+def normalize_lithology(lithology_name):
+    """
+    Приводим название грунта к одному из LITHOLOGY_TYPES
+    """
+    if not isinstance(lithology_name, str):
+        return DEFAULT_LITHOLOGY
+
+    return _normalize_lithology_str(lithology_name)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_lithology_str(lithology_name):
+    lith_lower = lithology_name.lower().strip()
+
+    for key, value in LITHOLOGY_KEYWORDS:
+        if key in lith_lower:
+            return value
+
+    for stem, value in LITHOLOGY_STEMS:
+        if stem in lith_lower:
+            return value
+
+    return DEFAULT_LITHOLOGY
+
+
+def normalize_lithology_column(values):
+    """
+    Нормализуем целую колонку названий грунтов.
+    Каждое уникальное название разбирается один раз, результат -
+    pd.Categorical с категориями LITHOLOGY_TYPES (стабильные коды)
+    """
+    import pandas as pd
+
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+
+    # Таблица "уникальное название -> код грунта", последний элемент для пропусков
+    lookup = np.empty(len(uniques) + 1, dtype=np.int8)
+    for i, name in enumerate(uniques):
+        lookup[i] = LITHOLOGY_CODES[normalize_lithology(name)]
+    lookup[-1] = DEFAULT_LITHOLOGY_CODE
+
+    return pd.Categorical.from_codes(lookup[codes], categories=LITHOLOGY_TYPES)
+
+
+def lithology_code(lithology_name):
+    """Код грунта для одного названия"""
+    return LITHOLOGY_CODES[normalize_lithology(lithology_name)]
+
+
+def encode_lithologies(values):
+    """Коды грунтов (np.int8) для массива названий"""
+    if len(values) < FACTORIZE_MIN_SIZE:
+        return np.array([lithology_code(name) for name in values], dtype=np.int8)
+    return np.asarray(normalize_lithology_column(values).codes, dtype=np.int8)
@@ -0,0 +1,165 @@
+"""
+Замеры времени по этапам: разбор журнала, прогнозы, обучение, отрисовка.
+
+По умолчанию выключены и почти ничего не стоят: декоратор делает одну
+проверку флага, контекстный менеджер ничего не запоминает. Включаются
+переменной окружения PERMAFROST_TIMINGS=1 или вызовом enable().
+Статистика общая для процесса (все сессии и поток обучения). Каждый
+замер также пишется JSON строкой в логгер "permafrost.timing" на уровне
+DEBUG - например, в файл из PERMAFROST_TIMINGS_LOG.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+TIMINGS_ENV = "PERMAFROST_TIMINGS"
+TIMINGS_LOG_ENV = "PERMAFROST_TIMINGS_LOG"
+
+logger = logging.getLogger("permafrost.timing")
+
+_enabled = os.environ.get(TIMINGS_ENV, "") not in ("", "0")
+_lock = threading.Lock()
+# Этап -> [число вызовов, суммарное время, минимум, максимум], секунды
+_stages = {}
+# Счётчик -> значение
+_counters = {}
+
+
+def enable(log_path=None):
+    """Включаем замеры; log_path - файл для JSON строк по каждому замеру"""
+    global _enabled
+    log_path = log_path or os.environ.get(TIMINGS_LOG_ENV)
+    if log_path and not any(
+        getattr(handler, "baseFilename", None) == os.path.abspath(log_path)
+        for handler in logger.handlers
+    ):
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def record(stage, seconds):
+    """Добавляем замер этапа (вызывается таймерами, если замеры включены)"""
+    with _lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            _stages[stage] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            json.dumps(
+                {
+                    "time": round(time.time(), 3),
+                    "stage": stage,
+                    "ms": round(seconds * 1000, 3),
+                    "thread": threading.current_thread().name,
+                },
+                ensure_ascii=False,
+            )
+        )
+
+
+def count(name, value=1):
+    """Увеличиваем счётчик (например, число прогнозируемых точек)"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+class timed:
+    """
+    Замер этапа: контекстный менеджер (with timed("app.plot"): ...)
+    или декоратор (@timed("model.predict_profile"))
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            record(self.stage, time.perf_counter() - self.start)
+            self.start = None
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+
+        return wrapper
+
+
+def snapshot():
+    """Статистика этапов (по убыванию суммарного времени) и счётчики"""
+    with _lock:
+        stages = [
+            {
+                "stage": stage,
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / calls * 1000, 3),
+                "min_ms": round(minimum * 1000, 3),
+                "max_ms": round(maximum * 1000, 3),
+            }
+            for stage, (calls, total, minimum, maximum) in _stages.items()
+        ]
+        counters = dict(_counters)
+
+    stages.sort(key=lambda row: row["total_ms"], reverse=True)
+    return {"stages": stages, "counters": counters}
+
+
+def export_json(path=None):
+    """Статистика в JSON: строка, а с path - ещё и запись в файл"""
+    data = json.dumps(snapshot(), ensure_ascii=False, indent=2)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    return data
+
+
+if _enabled:
+    enable()